@@ -0,0 +1,333 @@
+"""
+Local stand-in for snowflake.connector that replays recorded or synthetic
+result sets, so SnowConn can be benchmarked without a Snowflake account.
+
+install() registers the fake modules in sys.modules. As snowconn imports the
+connector lazily, this has to happen before the first query, not before
+snowconn is imported.
+"""
+import datetime
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import types
+
+# snowflake connector type codes
+FIXED = 0
+REAL = 1
+TEXT = 2
+TIMESTAMP_NTZ = 8
+VARIANT = 5
+OBJECT = 9
+ARRAY = 10
+
+
+class ProgrammingError(Exception):
+    pass
+
+
+class DictCursor:
+    """Marker class, like snowflake.connector.DictCursor"""
+
+
+class ResultSet:
+    """
+    Rows and cursor description of one result set
+
+    :param description: list of (name, type_code, display_size,
+    internal_size, precision, scale, null_ok) tuples
+    :param rows: list of tuples
+    """
+
+    def __init__(self, description, rows):
+        self.description = [tuple(desc) for desc in description]
+        self.rows = [tuple(row) for row in rows]
+
+    @property
+    def names(self):
+        return [desc[0] for desc in self.description]
+
+    def nbytes(self) -> int:
+        """Approximate size of the result as transferred, in bytes"""
+        return sum(len(str(value)) for row in self.rows for value in row)
+
+    def save(self, path: str):
+        """Records the result set to a JSON file"""
+        with open(path, 'w') as fh:
+            json.dump({'description': self.description, 'rows': self.rows},
+                      fh, default=str)
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads a result set recorded with save()"""
+        with open(path) as fh:
+            data = json.load(fh)
+        return cls(data['description'], data['rows'])
+
+    @classmethod
+    def synthetic(cls, n_rows: int, seed: int = 0):
+        """
+        Generates a result set with a mix of numbers, text, timestamps and
+        semi-structured (VARIANT, OBJECT, ARRAY) columns, with some NULLs
+        """
+        rng = random.Random(seed)
+        description = [
+            ('ID', FIXED, None, None, 38, 0, False),
+            ('PRICE', REAL, None, None, None, None, True),
+            ('SHOP', TEXT, None, 16777216, None, None, True),
+            ('DOWNLOADED_ON', TIMESTAMP_NTZ, None, None, 0, 9, True),
+            ('ATTRIBUTES', OBJECT, None, None, None, None, True),
+            ('TAGS', ARRAY, None, None, None, None, True),
+            ('RAW', VARIANT, None, None, None, None, True),
+        ]
+        start = datetime.datetime(2018, 11, 18)
+        shops = ['ahed', 'colr', 'delh', 'albe', 'jumb']
+        rows = [
+            (
+                i,
+                round(rng.uniform(0.1, 100), 2) if i % 50 else None,
+                rng.choice(shops),
+                start + datetime.timedelta(seconds=i),
+                json.dumps({'brand': f'brand{i % 97}', 'size': i % 13,
+                            'promo': bool(i % 2)}),
+                json.dumps([f'tag{j}' for j in range(i % 4)]),
+                json.dumps(rng.random()) if i % 10 else None,
+            )
+            for i in range(n_rows)
+        ]
+        return cls(description, rows)
+
+    def to_arrow(self):
+        import pyarrow as pa
+        columns = list(zip(*self.rows)) or [[] for _ in self.description]
+        return pa.table(
+            [pa.array(list(column)) for column in columns], names=self.names)
+
+
+class FakeCursor:
+
+    def __init__(self, connection, cursor_class=None):
+        self.connection = connection
+        self._dict = cursor_class is DictCursor
+        self._result = None
+        self._rows = iter(())
+        self.description = None
+        self.rowcount = None
+        self.sfqid = None
+
+    def execute(self, command, params=None, **kwargs):
+        self.connection.executed.append(command)
+        self._result = self.connection.result_for(command)
+        self._rows = iter(self._result.rows)
+        self.description = self._result.description
+        self.rowcount = len(self._result.rows)
+        self.sfqid = f'fake-{next(self.connection.query_ids)}'
+        return self
+
+    def execute_async(self, command, params=None, **kwargs):
+        self.execute(command, params)
+        self.connection.async_results[self.sfqid] = self._result
+        return {'queryId': self.sfqid}
+
+    def get_results_from_sfqid(self, sfqid):
+        self._result = self.connection.async_results[sfqid]
+        self._rows = iter(self._result.rows)
+        self.description = self._result.description
+        self.rowcount = len(self._result.rows)
+        self.sfqid = sfqid
+
+    def executemany(self, command, seq_of_params):
+        self.connection.executed.append(command)
+        self.rowcount = len(seq_of_params)
+        return self
+
+    def _wrap(self, row):
+        if self._dict:
+            return dict(zip(self._result.names, row))
+        return row
+
+    def fetchone(self):
+        row = next(self._rows, None)
+        return None if row is None else self._wrap(row)
+
+    def fetchmany(self, size=1):
+        return [self._wrap(row) for row in itertools.islice(self._rows, size)]
+
+    def fetchall(self):
+        return [self._wrap(row) for row in self._rows]
+
+    def __iter__(self):
+        for row in self._rows:
+            yield self._wrap(row)
+
+    def fetch_arrow_batches(self):
+        rows = list(self._rows)
+        size = self.connection.chunk_size
+        for start in range(0, len(rows), size):
+            yield ResultSet(
+                self._result.description, rows[start:start + size]).to_arrow()
+
+    def fetch_arrow_all(self):
+        import pyarrow as pa
+        batches = list(self.fetch_arrow_batches())
+        return pa.concat_tables(batches) if batches else None
+
+    def fetch_pandas_batches(self):
+        for batch in self.fetch_arrow_batches():
+            yield batch.to_pandas()
+
+    def fetch_pandas_all(self):
+        table = self.fetch_arrow_all()
+        if table is None:
+            import pandas as pd
+            return pd.DataFrame(columns=self._result.names)
+        return table.to_pandas()
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    Stand-in for a snowflake.connector connection. Every query returns the
+    result set registered for it with add_result, or the default one.
+    Statements that do not return rows (PUT, COPY, CREATE, ...) return an
+    empty result set.
+    """
+
+    def __init__(self, default_result: ResultSet = None,
+                 chunk_size: int = 100000):
+        self.default_result = default_result or ResultSet([], [])
+        self.chunk_size = chunk_size
+        self.results = {}
+        self.async_results = {}
+        self.executed = []
+        self.query_ids = itertools.count()
+        self.database = 'BENCHMARK'
+        self.schema = 'PUBLIC'
+        self.role = 'SYSADMIN'
+
+    def add_result(self, sql: str, result: ResultSet):
+        self.results[sql] = result
+
+    def result_for(self, sql: str) -> ResultSet:
+        if sql in self.results:
+            return self.results[sql]
+        if 'sqlite_master' in sql:
+            # DataFrame.to_sql checking whether the table exists
+            return ResultSet([('name', TEXT, None, None, None, None, True)], [])
+        if sql.lstrip().upper().startswith(('SELECT', 'WITH', 'SHOW')):
+            return self.default_result
+        if sql.startswith('PUT '):
+            path = sql.split("'")[1][len('file://'):]
+            os.stat(path)
+        return ResultSet([('status', TEXT, None, None, None, None, True)], [])
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self, cursor_class)
+
+    def execute_string(self, sql_text: str, remove_comments=False,
+                       return_cursors=True, cursor_class=None, **kwargs):
+        return list(self.execute_stream(
+            io.StringIO(sql_text), remove_comments, cursor_class))
+
+    def execute_stream(self, stream, remove_comments=False,
+                       cursor_class=None, **kwargs):
+        for statement, _ in split_statements(stream, remove_comments):
+            yield self.cursor(cursor_class).execute(statement)
+
+    def get_query_status(self, sfqid):
+        return 'SUCCESS'
+
+    def get_query_status_throw_if_error(self, sfqid):
+        return 'SUCCESS'
+
+    def is_still_running(self, status):
+        return False
+
+    def is_closed(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class FakeAlchemyConnection:
+    """
+    Stands in for the SQLAlchemy connection SnowConn holds, so that
+    connection.connection.connection is the raw connection. Without
+    SQLAlchemy, DataFrame.to_sql treats it as a DBAPI connection, so it
+    also hands out cursors of the raw connection.
+    """
+
+    def __init__(self, raw_connection: FakeConnection):
+        self.connection = types.SimpleNamespace(connection=raw_connection)
+
+    def cursor(self):
+        return self.connection.connection.cursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def split_statements(stream, remove_comments=False):
+    """
+    Simplified snowflake.connector.util_text.split_statements: splits on
+    semicolons outside of single quotes
+    """
+    statement = []
+    in_quote = False
+    for line in stream:
+        for char in line:
+            if char == "'":
+                in_quote = not in_quote
+            statement.append(char)
+            if char == ';' and not in_quote:
+                text = ''.join(statement).strip()
+                statement = []
+                if text:
+                    yield text, False
+    text = ''.join(statement).strip()
+    if text:
+        yield text, False
+
+
+def install():
+    """
+    Registers the fake snowflake.connector in sys.modules
+    """
+    snowflake = types.ModuleType('snowflake')
+    connector = types.ModuleType('snowflake.connector')
+    util_text = types.ModuleType('snowflake.connector.util_text')
+    connector.DictCursor = DictCursor
+    connector.ProgrammingError = ProgrammingError
+    connector.errors = types.SimpleNamespace(ProgrammingError=ProgrammingError)
+    connector.util_text = util_text
+    connector.paramstyle = 'pyformat'
+    util_text.split_statements = split_statements
+    snowflake.connector = connector
+    sys.modules['snowflake'] = snowflake
+    sys.modules['snowflake.connector'] = connector
+    sys.modules['snowflake.connector.util_text'] = util_text
+
+
+def make_snowconn(result: ResultSet, chunk_size: int = 100000):
+    """
+    Returns a SnowConn connected to a FakeConnection that returns result for
+    every query
+    """
+    from snowconn import SnowConn
+    raw_connection = FakeConnection(result, chunk_size)
+    conn = SnowConn()
+    conn._raw_connection = raw_connection
+    conn._connection = FakeAlchemyConnection(raw_connection)
+    return conn
@@ -0,0 +1,248 @@
+"""
+Benchmarks of the public SnowConn methods against a local fake of the
+snowflake connector (see fake_connector.py), so they run without network.
+
+    python benchmarks/run.py --rows 100000
+    python benchmarks/run.py --json results.json
+    python benchmarks/run.py --baseline results.json --tolerance 0.25
+
+For each benchmark the best time of --repeat runs is reported as rows/s and
+MB/s (of the result as transferred), together with the peak memory traced
+by tracemalloc in a separate run. tracemalloc does not see memory allocated
+by pyarrow, so peak memory of the Arrow based benchmarks is a lower bound.
+
+Benchmarks running several queries return the number of rows they
+processed, so that rows/s stays comparable.
+
+With --baseline, the exit status is 1 when a benchmark is more than
+--tolerance slower than in the baseline, so regressions fail CI.
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_connector  # noqa: E402
+from snowconn import gather  # noqa: E402
+
+SQL = 'select * from price;'
+# number of queries of the script and submit benchmarks
+QUERIES = 4
+SCRIPT = '\n'.join(f'select * from price_{n};' for n in range(QUERIES))
+
+
+def has(*modules):
+    return all(importlib.util.find_spec(module) for module in modules)
+
+
+def bench_execute_simple(conn, result):
+    conn.execute_simple(SQL)
+
+
+def bench_execute_simple_orjson(conn, result):
+    conn.execute_simple(SQL, json_decoder='orjson')
+
+
+def bench_execute_simple_lazy(conn, result):
+    for row in conn.execute_simple(SQL, row_type='lazy'):
+        row['PRICE']
+
+
+def bench_execute_simple_columns(conn, result):
+    conn.execute_simple(SQL, orient='columns', column_arrays=True)
+
+
+def bench_execute_iter(conn, result):
+    for _ in conn.execute_iter(SQL):
+        pass
+
+
+def bench_read_df(conn, result):
+    conn.read_df(SQL)
+
+
+def bench_read_df_dtype(conn, result):
+    conn.read_df(SQL, columns=['id', 'price', 'shop'],
+                 dtype={'price': 'float32', 'shop': 'category'})
+
+
+def bench_read_batches(conn, result):
+    for _ in conn.read_batches(SQL):
+        pass
+
+
+def bench_read_arrow(conn, result):
+    conn.read_arrow(SQL)
+
+
+def bench_execute_string(conn, result):
+    for cursor in conn.execute_string(SCRIPT):
+        cursor.fetchall()
+    return QUERIES * len(result.rows)
+
+
+def bench_execute_string_parallel(conn, result):
+    for cursor in conn.execute_string(SCRIPT, parallel=True):
+        cursor.fetchall()
+    return QUERIES * len(result.rows)
+
+
+def bench_execute_file(conn, result):
+    for cursor in conn.execute_file(conn._benchmark_script):
+        cursor.fetchall()
+    return QUERIES * len(result.rows)
+
+
+def bench_execute_file_stream(conn, result):
+    for cursor in conn.execute_file(conn._benchmark_script, stream=True):
+        cursor.fetchall()
+    return QUERIES * len(result.rows)
+
+
+def bench_submit_gather(conn, result):
+    gather([conn.submit(SQL) for _ in range(QUERIES)])
+    return QUERIES * len(result.rows)
+
+
+def bench_spill(conn, result):
+    conn.spill(SQL, os.path.join(conn._benchmark_dir, 'price.arrow'))
+
+
+def bench_read_polars(conn, result):
+    conn.read_polars(SQL)
+
+
+def bench_write_df(conn, result):
+    conn.write_df(conn._benchmark_df, 'price_copy')
+
+
+def bench_write_df_bulk(conn, result):
+    conn.write_df(conn._benchmark_df, 'price_copy', bulk=True,
+                  bulk_chunksize=max(len(result.rows) // 8, 1))
+
+
+BENCHMARKS = [
+    (bench_execute_simple, ()),
+    (bench_execute_simple_orjson, ('orjson',)),
+    (bench_execute_simple_lazy, ()),
+    (bench_execute_simple_columns, ()),
+    (bench_execute_iter, ()),
+    (bench_execute_string, ()),
+    (bench_execute_string_parallel, ()),
+    (bench_execute_file, ()),
+    (bench_execute_file_stream, ()),
+    (bench_submit_gather, ()),
+    (bench_read_df, ('pandas', 'pyarrow')),
+    (bench_read_df_dtype, ('pandas', 'pyarrow', 'numpy')),
+    (bench_read_batches, ('pandas', 'pyarrow')),
+    (bench_read_arrow, ('pyarrow',)),
+    (bench_spill, ('pyarrow',)),
+    (bench_read_polars, ('polars', 'pyarrow')),
+    (bench_write_df, ('pandas', 'pyarrow')),
+    (bench_write_df_bulk, ('pandas', 'pyarrow')),
+]
+
+
+def run(rows: int, repeat: int, only: str = None):
+    fake_connector.install()
+    result = fake_connector.ResultSet.synthetic(rows)
+    megabytes = result.nbytes() / 1e6
+    conn = fake_connector.make_snowconn(result)
+    if has('pandas', 'pyarrow'):
+        conn._benchmark_df = conn.read_df(SQL).drop(
+            columns=['attributes', 'tags', 'raw'])
+    with tempfile.TemporaryDirectory() as tmpdir:
+        conn._benchmark_dir = tmpdir
+        conn._benchmark_script = os.path.join(tmpdir, 'script.sql')
+        with open(conn._benchmark_script, 'w') as fh:
+            fh.write(SCRIPT)
+        return _run(conn, result, megabytes, repeat, only)
+
+
+def _run(conn, result, megabytes: float, repeat: int, only: str = None):
+    results = {}
+    for bench, requirements in BENCHMARKS:
+        name = bench.__name__[len('bench_'):]
+        if only and only not in name:
+            continue
+        if not has(*requirements):
+            print(f'{name:<28} skipped, requires {", ".join(requirements)}')
+            continue
+
+        times = []
+        for _ in range(repeat):
+            gc.collect()
+            started = time.perf_counter()
+            processed = bench(conn, result) or len(result.rows)
+            times.append(time.perf_counter() - started)
+        best = min(times)
+        # the size of the result as transferred, scaled to the rows processed
+        scale = processed / max(len(result.rows), 1)
+
+        gc.collect()
+        tracemalloc.start()
+        bench(conn, result)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[name] = {
+            'seconds': best,
+            'rows_per_second': processed / best,
+            'mb_per_second': megabytes * scale / best,
+            'peak_memory_mb': peak / 1e6,
+        }
+        print(f'{name:<28} {processed / best:>12,.0f} rows/s '
+              f'{megabytes * scale / best:>8.1f} MB/s '
+              f'{peak / 1e6:>8.1f} MB peak')
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    ok = True
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['rows_per_second']
+        change = current['rows_per_second'] / before - 1
+        if change < -tolerance:
+            ok = False
+            print(f'REGRESSION {name}: {change:+.0%} rows/s')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help='only run benchmarks containing this')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        # pandas warns that the fake connection is not a SQLAlchemy one
+        warnings.simplefilter('ignore', UserWarning)
+        results = run(args.rows, args.repeat, args.only)
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,2 @@
 from .connect import SnowConn
+from .query import QueryHandle, gather
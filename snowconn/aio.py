@@ -0,0 +1,215 @@
+"""
+asyncio facade around SnowConn. This module is not imported by
+`import snowconn` because importing asyncio is slow, import it with
+`from snowconn.aio import AsyncSnowConn`.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+from typing import List
+
+from .connect import SnowConn
+from .result_cache import MISSING
+
+
+class AsyncSnowConn:
+    """
+    Wraps a SnowConn so that it can be used from asyncio code without
+    blocking the event loop.
+
+    Queries are submitted asynchronously to snowflake and their status is
+    polled with non-blocking sleeps, so waiting for a query does not hold a
+    thread. Blocking calls into the connector run on a bounded thread pool of
+    max_workers threads, or on the given executor, which is left running by
+    close().
+
+    async with await AsyncSnowConn.connect() as conn:
+        rows = await conn.execute_simple('select 1;')
+    """
+
+    def __init__(self, conn: SnowConn, max_workers: int = 8,
+                 poll_interval: float = 0.1, max_poll_interval: float = 5.0,
+                 executor: ThreadPoolExecutor = None):
+        self._conn = conn
+        # only the thread pools created here are shut down by close()
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers)
+        self._poll_interval = poll_interval
+        self._max_poll_interval = max_poll_interval
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @classmethod
+    async def _connect(cls, method, *args, max_workers: int = 8,
+                       poll_interval: float = 0.1,
+                       max_poll_interval: float = 5.0, **kwargs):
+        executor = ThreadPoolExecutor(max_workers)
+        loop = asyncio.get_running_loop()
+        try:
+            conn = await loop.run_in_executor(
+                executor, functools.partial(method, *args, **kwargs))
+        except BaseException:
+            executor.shutdown(wait=False)
+            raise
+        async_conn = cls(conn, poll_interval=poll_interval,
+                         max_poll_interval=max_poll_interval,
+                         executor=executor)
+        async_conn._owns_executor = True
+        return async_conn
+
+    @classmethod
+    async def connect(cls, *args, **kwargs):
+        """See SnowConn.connect"""
+        return await cls._connect(SnowConn.connect, *args, **kwargs)
+
+    @classmethod
+    async def connect_local(cls, *args, **kwargs):
+        """See SnowConn.connect_local"""
+        return await cls._connect(SnowConn.connect_local, *args, **kwargs)
+
+    @classmethod
+    async def connect_secretsmanager(cls, *args, **kwargs):
+        """See SnowConn.connect_secretsmanager"""
+        return await cls._connect(
+            SnowConn.connect_secretsmanager, *args, **kwargs)
+
+    @classmethod
+    async def connect_credentials(cls, *args, **kwargs):
+        """See SnowConn.connect_credentials"""
+        return await cls._connect(
+            SnowConn.connect_credentials, *args, **kwargs)
+
+    def get_snowconn(self) -> SnowConn:
+        """Returns the wrapped SnowConn"""
+        return self._conn
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def _wait(self, handle):
+        poll_interval = self._poll_interval
+        try:
+            while await self._run(handle.is_running):
+                await asyncio.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, self._max_poll_interval)
+        except asyncio.CancelledError:
+            await self._run(handle.cancel)
+            raise
+
+    async def submit(self, sql: str, params=None, idempotent: bool = None):
+        """
+        Submits a query without waiting for it, see SnowConn.submit
+        :return: QueryHandle
+        """
+        return await self._run(self._conn.submit, sql, params, idempotent)
+
+    def _cache_key(self, sql: str, use_cache: bool, *options):
+        with self._conn.checkout(raw=True) as raw_connection:
+            return self._conn._get_result_cache_key(
+                raw_connection, use_cache, sql, *options)
+
+    async def execute_simple(self, sql: str, params=None, json_decoder='json',
+                             decode: bool = True, row_type: str = 'dict',
+                             orient: str = 'records',
+                             column_arrays: bool = False,
+                             batch_size: int = 10000, use_cache: bool = True,
+                             idempotent: bool = None):
+        """
+        See SnowConn.execute_simple, which takes the same options and shares
+        the hooks, the result cache and the retry policy. The query is
+        cancelled when the awaiting task is cancelled.
+        """
+        if orient not in ('records', 'columns'):
+            raise ValueError(f"orient must be 'records' or 'columns', not {orient!r}")
+        conn = self._conn
+        with conn._instrument('execute_simple', sql) as event:
+            cache_key = await self._run(
+                self._cache_key, sql, use_cache, 'execute_simple', params,
+                json_decoder, decode, row_type, orient, column_arrays)
+            if cache_key is not None:
+                cached = conn._result_cache.get(cache_key)
+                if cached is not MISSING:
+                    event.cached = True
+                    return cached
+
+            with event.phase('execute'):
+                handle = await self.submit(sql, params, idempotent)
+                event.query_id = handle.query_id
+                await self._wait(handle)
+            result = await self._run(
+                handle.result, json_decoder=json_decoder, decode=decode,
+                row_type=row_type, orient=orient,
+                column_arrays=column_arrays, batch_size=batch_size,
+                event=event)
+        if cache_key is not None:
+            conn._result_cache.set(cache_key, result)
+        return result
+
+    async def read_df(self, sql: str, lowercase_columns: bool = True,
+                      use_cache: bool = True, spill_to: str = None,
+                      columns: List[str] = None, rename=None,
+                      dtype: dict = None, dtype_backend: str = None,
+                      idempotent: bool = None):
+        """
+        See SnowConn.read_df, which takes the same options and shares the
+        hooks, the result cache and the retry policy. The query is cancelled
+        when the awaiting task is cancelled, except with spill_to, which
+        streams the result to disk on a worker thread.
+        """
+        conn = self._conn
+        if spill_to:
+            return await self._run(
+                conn.read_df, sql, lowercase_columns, spill_to=spill_to,
+                columns=columns, rename=rename, dtype=dtype,
+                dtype_backend=dtype_backend)
+        with conn._instrument('read_df', sql) as event:
+            cache_key = await self._run(
+                self._cache_key, sql, use_cache, 'read_df',
+                lowercase_columns, columns, rename, dtype, dtype_backend)
+            if cache_key is not None:
+                cached = conn._result_cache.get(cache_key)
+                if cached is not MISSING:
+                    event.cached = True
+                    return cached
+
+            with event.phase('execute'):
+                handle = await self.submit(sql, idempotent=idempotent)
+                event.query_id = handle.query_id
+                await self._wait(handle)
+            read_df = await self._run(
+                handle.result_df, lowercase_columns=lowercase_columns,
+                columns=columns, rename=rename, dtype=dtype,
+                dtype_backend=dtype_backend, event=event)
+        if cache_key is not None:
+            conn._result_cache.set(cache_key, read_df)
+        return read_df
+
+    async def execute_string(self, sql: str, *args, **kwargs):
+        """See SnowConn.execute_string"""
+        return await self._run(self._conn.execute_string, sql, *args, **kwargs)
+
+    async def execute_file(self, fname: str, *args, **kwargs):
+        """See SnowConn.execute_file"""
+        return await self._run(self._conn.execute_file, fname, *args, **kwargs)
+
+    async def write_df(self, df, table: str, *args, **kwargs):
+        """See SnowConn.write_df"""
+        return await self._run(self._conn.write_df, df, table, *args, **kwargs)
+
+    async def close(self):
+        """
+        Closes the wrapped SnowConn and shuts down the thread pool, unless it
+        was passed in
+        :return: None
+        """
+        try:
+            await self._run(self._conn.close)
+        finally:
+            if self._owns_executor:
+                self._executor.shutdown(wait=False)
@@ -1,27 +1,130 @@
+from contextlib import contextmanager
+import hashlib
+import io
 import json
 import logging
 from typing import List
 import os
+import tempfile
+import threading
+import time
+import uuid
 import warnings
 
-import configparser
-import snowflake.connector
-from sqlalchemy import create_engine
+from .instrumentation import QueryEvent
+from .query import QueryHandle
+from .result_cache import MISSING, ResultCache, is_query, is_value
+from .retry import SESSION_EXPIRED_ERRNOS, RetryPolicy, get_errno
+from .script import plan_statements
+from .rows import (
+    LazyRow, RowSchema, decode_columns, get_columns_to_parse, get_json_loads,
+    make_columns,
+)
+
+# snowflake.connector, sqlalchemy and configparser are imported where they are
+# used: importing them costs about a second, which short lived scripts that
+# only import snowconn should not have to pay.
 
 
 class InvalidMethodException(Exception):
     pass
 
 
+class _SkippedStatement(Exception):
+    """
+    Raised for the statements that were not started by
+    execute_string(parallel=True) because another statement failed
+    """
+
+
+# Process-wide registry of SQLAlchemy engines, keyed by the connection
+# parameters, so that SnowConn objects created with identical parameters
+# share a single engine (and its connection pool).
+_engine_cache = {}
+_engine_cache_lock = threading.Lock()
+
+# secretsmanager clients and secret payloads are kept per process so that
+# repeated connect_secretsmanager calls skip the boto3 client construction
+# and, when a ttl is given, the get_secret_value call.
+_secretsmanager_clients = {}
+_secrets_cache = {}
+_secrets_cache_lock = threading.Lock()
+
+
+def _close_connection(future):
+    """
+    Done callback closing the connections that lost a race or timed out in
+    SnowConn.connect
+    """
+    if not future.cancelled() and future.exception() is None:
+        try:
+            future.result().close()
+        except Exception as e:
+            logging.error(e)
+
+
+_connect_methods_path = os.path.join(
+    os.path.expanduser('~'), '.snowconn', 'connect_methods.json')
+
+
+def _load_connect_methods():
+    try:
+        with open(_connect_methods_path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_connect_method(methods: str, method: str):
+    connect_methods = _load_connect_methods()
+    if connect_methods.get(methods) == method:
+        return
+    connect_methods[methods] = method
+    try:
+        os.makedirs(os.path.dirname(_connect_methods_path), exist_ok=True)
+        with open(_connect_methods_path, 'w') as fh:
+            json.dump(connect_methods, fh)
+    except OSError as e:
+        logging.warning(f'could not remember connect method: {e}')
+
+
+def _write_parquet_chunk(df, path: str):
+    """
+    Writes one chunk of a dataframe for write_df(bulk=True). This runs in a
+    worker process, so it is a module level function.
+    :return: tuple of the time spent and the size of the file in bytes
+    """
+    started = time.perf_counter()
+    df.to_parquet(path, index=False, compression='snappy',
+                  coerce_timestamps='us', allow_truncated_timestamps=True)
+    return time.perf_counter() - started, os.path.getsize(path)
+
+
 class SnowConn:
     _alchemy_engine = None
     _connection = None
     _raw_connection = None
+    _engine_key = None
+    _pooled = False
+    _result_cache = None
+    _retry_policy = None
+    _reconnect = False
+    _reconnect_lock = None
+    _closed = False
+    _hooks = ()
 
     def __init__(self):
         self._alchemy_engine = None
         self._connection = None
         self._raw_connection = None
+        self._engine_key = None
+        self._pooled = False
+        self._result_cache = None
+        self._retry_policy = None
+        self._reconnect = False
+        self._reconnect_lock = threading.Lock()
+        self._closed = False
+        self._hooks = []
 
     def __enter__(self):
         return self
@@ -30,27 +133,105 @@ class SnowConn:
         self.close()
 
     @classmethod
-    def connect(cls, methods: List[str] = ['local'], *args, **kwargs):
+    def connect(cls, methods: List[str] = ['local'], *args,
+                race: bool = False, method_timeout: float = None,
+                remember_method: bool = False, **kwargs):
         """
         Generic connect method
         Will iterate through a list of connection methods until one succeeds
         in creating a connection
         from snowconn import SnowConn
         conn = SnowConn.autoconnect(method=['secretsmanager'], credsman_name='acme')
+
+        :param race: try all methods at the same time and keep the first
+        connection that succeeds. The other connections are closed.
+        :param method_timeout: number of seconds after which a method is
+        given up on. A connection that is made after its timeout is closed.
+        :param remember_method: try the method that succeeded last time for
+        the same list of methods first. It is remembered in
+        ~/.snowconn/connect_methods.json, so this also works across
+        processes.
         """
         available_methods = {
             'secretsmanager': cls.connect_secretsmanager,
             'local': cls.connect_local,
             'credentials': cls.connect_credentials,
         }
-        for method in methods:
-            if method in available_methods:
+        candidates = [method for method in methods if method in available_methods]
+        if remember_method:
+            last_method = _load_connect_methods().get(','.join(methods))
+            if last_method in candidates:
+                candidates.remove(last_method)
+                candidates.insert(0, last_method)
+
+        if race:
+            method, conn = cls._race_methods(
+                available_methods, candidates, method_timeout, args, kwargs)
+        else:
+            method, conn = cls._try_methods(
+                available_methods, candidates, method_timeout, args, kwargs)
+        if conn is None:
+            raise InvalidMethodException(f'methods {methods} are not a valid connection methods. Valid methods are "secretsmanager, local, credentials"')
+        if remember_method:
+            _save_connect_method(','.join(methods), method)
+        return conn
+
+    @staticmethod
+    def _try_methods(available_methods, candidates, method_timeout, args,
+                     kwargs):
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        for method in candidates:
+            try:
+                if method_timeout is None:
+                    return method, available_methods[method](*args, **kwargs)
+                executor = ThreadPoolExecutor(1)
+                future = executor.submit(
+                    available_methods[method], *args, **kwargs)
+                executor.shutdown(wait=False)
+                try:
+                    return method, future.result(method_timeout)
+                except FutureTimeoutError:
+                    future.add_done_callback(_close_connection)
+                    raise TimeoutError(
+                        f'connect method {method} timed out after '
+                        f'{method_timeout}s')
+            except Exception as e:
+                logging.error(e)
+        return None, None
+
+    @staticmethod
+    def _race_methods(available_methods, candidates, method_timeout, args,
+                      kwargs):
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        if not candidates:
+            return None, None
+        executor = ThreadPoolExecutor(len(candidates))
+        futures = {
+            executor.submit(available_methods[method], *args, **kwargs): method
+            for method in candidates
+        }
+        executor.shutdown(wait=False)
+        winner = None
+        try:
+            for future in as_completed(futures, timeout=method_timeout):
                 try:
-                    return available_methods[method](*args, **kwargs)
+                    conn = future.result()
                 except Exception as e:
                     logging.error(e)
-        else:
-            raise InvalidMethodException(f'methods {methods} are not a valid connection methods. Valid methods are "secretsmanager, local, credentials"')
+                    continue
+                winner = future
+                return futures[future], conn
+        except FutureTimeoutError:
+            logging.error(
+                f'connect methods {candidates} timed out after '
+                f'{method_timeout}s')
+        finally:
+            for future in futures:
+                if future is not winner:
+                    future.add_done_callback(_close_connection)
+        return None, None
 
     @classmethod
     def connect_local(cls, db: str = 'public', schema: str = 'public',
@@ -64,7 +245,7 @@ class SnowConn:
         creds = conn._get_local_creds(local_creds_path)
         conn._create_engine(
             creds, db, schema, autocommit=autocommit, role=role,
-            warehouse=warehouse)
+            warehouse=warehouse, **kwargs)
         return conn
 
     def _get_local_creds(self, local_creds_path: str = None):
@@ -78,6 +259,7 @@ class SnowConn:
                 f'login credentials to the config file.'
             )
         else:
+            import configparser
             config = configparser.ConfigParser()
             config.read(snowsql_config)
 
@@ -95,10 +277,15 @@ class SnowConn:
                          role: str = None, aws_region_name='eu-west-1',
                          aws_access_key_id=None, aws_secret_access_key=None,
                          warehouse=None, fallback_to_local_creds=False,
-                         local_creds_path=None, region_name=None, **kwargs):
+                         local_creds_path=None, region_name=None,
+                         secrets_cache_ttl: float = None, **kwargs):
         """
         Creates an engine and connection to the specified snowflake db using
         credentials from AWS secrets manager
+
+        :param secrets_cache_ttl: number of seconds to keep the secret in an
+        in-process cache. By default the secret is fetched on every call.
+        Use SnowConn.invalidate_secret() after rotating a secret.
         """
         try:
             import boto3 # noqa
@@ -117,8 +304,9 @@ class SnowConn:
             aws_region_name = region_name
         conn = SnowConn()
         creds = conn._get_secretsmanager_creds(credsman_name, aws_region_name,
-                aws_access_key_id, aws_secret_access_key)
-        conn._create_engine(creds, db, schema, autocommit, role, warehouse)
+                aws_access_key_id, aws_secret_access_key, secrets_cache_ttl)
+        conn._create_engine(creds, db, schema, autocommit, role, warehouse,
+                            **kwargs)
         return conn
 
     @classmethod
@@ -151,17 +339,55 @@ class SnowConn:
             'PASSWORD': password,
             'AUTHENTICATOR': authenticator,
         }
-        conn._create_engine(creds, db, schema, autocommit, role, warehouse)
+        conn._create_engine(creds, db, schema, autocommit, role, warehouse,
+                            **kwargs)
         return conn
 
     def _get_secretsmanager_creds(self, credsman_name: str, region_name: str,
-                        aws_access_key_id: str, aws_secret_access_key: str):
+                        aws_access_key_id: str, aws_secret_access_key: str,
+                        secrets_cache_ttl: float = None):
+        key = (credsman_name, region_name, aws_access_key_id)
+        if secrets_cache_ttl:
+            with _secrets_cache_lock:
+                cached = _secrets_cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return dict(cached[1])
+
+        client = self._get_secretsmanager_client(
+            region_name, aws_access_key_id, aws_secret_access_key)
+        '''
+        try:
+            get_secret_value_response = client.get_secret_value(SecretId=credsman_name)
+        except botocore.exceptions.ClientError as error:
+            if error.response['Error']['Code'] in ('AccessDeniedException', 'ValidationException'):
+                return None
+            else:
+                raise error
+        '''
+        get_secret_value_response = client.get_secret_value(SecretId=credsman_name)
+        creds = json.loads(get_secret_value_response['SecretString'])
+
+        if secrets_cache_ttl:
+            with _secrets_cache_lock:
+                _secrets_cache[key] = (
+                    time.monotonic() + secrets_cache_ttl, dict(creds))
+        return creds
+
+    @staticmethod
+    def _get_secretsmanager_client(region_name: str, aws_access_key_id: str,
+                                   aws_secret_access_key: str):
         import boto3, botocore # noqa
+        key = (region_name, aws_access_key_id, aws_secret_access_key)
+        with _secrets_cache_lock:
+            client = _secretsmanager_clients.get(key)
+        if client is not None:
+            return client
+
         aws_creds = {}
         if aws_access_key_id and aws_secret_access_key:
             aws_creds = {
-                aws_access_key_id: aws_access_key_id,
-                aws_secret_access_key: aws_secret_access_key
+                'aws_access_key_id': aws_access_key_id,
+                'aws_secret_access_key': aws_secret_access_key
             }
 
         session = boto3.session.Session(**aws_creds)
@@ -170,21 +396,72 @@ class SnowConn:
             region_name=region_name,
             endpoint_url=f'https://secretsmanager.{region_name}.amazonaws.com'
         )
-        '''
-        try:
-            get_secret_value_response = client.get_secret_value(SecretId=credsman_name)
-        except botocore.exceptions.ClientError as error:
-            if error.response['Error']['Code'] in ('AccessDeniedException', 'ValidationException'):
-                return None
-            else:
-                raise error
-        '''
-        get_secret_value_response = client.get_secret_value(SecretId=credsman_name)
-        return json.loads(get_secret_value_response['SecretString'])
+        with _secrets_cache_lock:
+            return _secretsmanager_clients.setdefault(key, client)
+
+    @staticmethod
+    def invalidate_secret(credsman_name: str = None, region_name: str = None):
+        """
+        Drops secrets from the in-process secrets cache, for example after
+        a secret has been rotated.
+        :param credsman_name: only drop this secret, all secrets if None
+        :param region_name: only drop secrets from this region, all regions
+        if None
+        :return: None
+        """
+        with _secrets_cache_lock:
+            for key in list(_secrets_cache):
+                if credsman_name is not None and key[0] != credsman_name:
+                    continue
+                if region_name is not None and key[1] != region_name:
+                    continue
+                del _secrets_cache[key]
 
     def _create_engine(self, creds: dict, db: str, schema: str,
                        autocommit: bool = True, role: str = None,
-                       warehouse=None):
+                       warehouse=None, cache_engine: bool = False,
+                       pooled: bool = False, pool_size: int = None,
+                       max_overflow: int = None, pool_recycle: int = None,
+                       pool_pre_ping: bool = False, paramstyle: str = None,
+                       retry_policy: RetryPolicy = None,
+                       keep_alive: bool = False,
+                       heartbeat_frequency: int = None,
+                       reconnect: bool = False, **kwargs):
+        """
+        Creates the SQLAlchemy engine and opens a connection on it.
+
+        :param cache_engine: if True, reuse an engine from the process-wide
+        registry when one was already created with identical connection
+        parameters, so that no new Snowflake login is needed. close() then
+        returns the connection to the engine's pool instead of disposing it.
+        :param pooled: if True, no connection is held for the lifetime of this
+        object. Every query checks a connection out of the engine's QueuePool
+        instead (see checkout()), so that one SnowConn can be shared by
+        multiple threads.
+        :param pool_size: forwarded on to create_engine
+        :param max_overflow: forwarded on to create_engine
+        :param pool_recycle: forwarded on to create_engine
+        :param pool_pre_ping: forwarded on to create_engine
+        :param paramstyle: paramstyle of the snowflake connector connections:
+        'pyformat' (default) and 'format' bind parameters in the client,
+        'qmark' and 'numeric' bind them in snowflake. SQLAlchemy always uses
+        pyformat, so write_df without bulk does not work with qmark or
+        numeric.
+        :param retry_policy: RetryPolicy used to retry transient failures of
+        connecting and of idempotent statements, see snowconn.retry
+        :param keep_alive: keep the session alive while it is idle, with a
+        heartbeat sent by the snowflake connector from a background thread.
+        Heartbeats do not run queries, so they do not resume a warehouse.
+        :param heartbeat_frequency: number of seconds between heartbeats,
+        between 900 and 3600 (default 3600)
+        :param reconnect: when the session of the connection held by this
+        object is closed or has expired, open a new connection with the same
+        credentials and run the statement again on it. The statement never
+        ran on the expired session, but session state (temporary tables,
+        variables, USE ...) is lost: unqualified table names then resolve
+        against the database and schema given here. A closed SnowConn is
+        never reopened.
+        """
 
         account = creds['ACCOUNT']
         username = creds['USERNAME']
@@ -220,10 +497,64 @@ class SnowConn:
             f'{role_portion}{autocommit_portion}{warehouse_portion}{authenticator_portion}'
         )
 
-        engine = create_engine(connection_string)
+        from sqlalchemy import create_engine
+        engine_kwargs = {}
+        if pooled:
+            from sqlalchemy.pool import QueuePool
+            engine_kwargs['poolclass'] = QueuePool
+        if pool_size is not None:
+            engine_kwargs['pool_size'] = pool_size
+        if max_overflow is not None:
+            engine_kwargs['max_overflow'] = max_overflow
+        if pool_recycle is not None:
+            engine_kwargs['pool_recycle'] = pool_recycle
+        if pool_pre_ping:
+            engine_kwargs['pool_pre_ping'] = True
+        connect_args = {}
+        if paramstyle is not None:
+            connect_args['paramstyle'] = paramstyle
+        if keep_alive:
+            connect_args['client_session_keep_alive'] = True
+        if heartbeat_frequency is not None:
+            connect_args['client_session_keep_alive_heartbeat_frequency'] = (
+                heartbeat_frequency)
+        if connect_args:
+            engine_kwargs['connect_args'] = connect_args
+
+        if cache_engine:
+            # a digest of the credentials, so that a rotated password or
+            # different credentials for the same user get their own engine
+            # without keeping the password itself in the key
+            credentials_digest = hashlib.sha256(
+                repr((password, authenticator)).encode('utf-8')).hexdigest()
+            key = (account, username, credentials_digest, db, schema, role,
+                   warehouse, authenticator, autocommit,
+                   tuple(sorted(engine_kwargs)),
+                   pool_size, max_overflow, pool_recycle, paramstyle,
+                   keep_alive, heartbeat_frequency)
+            with _engine_cache_lock:
+                engine = _engine_cache.get(key)
+                if engine is None:
+                    engine = create_engine(connection_string, **engine_kwargs)
+                    _engine_cache[key] = engine
+            self._engine_key = key
+        else:
+            engine = create_engine(connection_string, **engine_kwargs)
         self._alchemy_engine = engine
-        self._connection = self._alchemy_engine.connect()
-        self._raw_connection = self._connection.connection.connection
+        self._pooled = pooled
+        self._retry_policy = retry_policy
+        self._reconnect = reconnect
+        # connecting can always be retried
+        if pooled:
+            # open (and return to the pool) one connection so that invalid
+            # credentials fail here rather than on the first query
+            with self._retry('connect', self._alchemy_engine.connect,
+                             idempotent=True):
+                pass
+        else:
+            self._connection = self._retry(
+                'connect', self._alchemy_engine.connect, idempotent=True)
+            self._raw_connection = self._connection.connection.connection
 
     def get_alchemy_engine(self):
         """
@@ -244,7 +575,39 @@ class SnowConn:
         """
         return self._raw_connection
 
-    def execute_simple(self, sql: str):
+    @contextmanager
+    def checkout(self, raw: bool = False):
+        """
+        Checks a connection out of the engine's pool for the duration of the
+        with block and returns it to the pool afterwards.
+
+        with conn.checkout(raw=True) as raw_connection:
+            raw_connection.cursor().execute('select 1;')
+
+        When the SnowConn is not pooled, the connection held by this object is
+        yielded instead and left open.
+        :param raw: yield the snowflake-connector connection instead of the
+        SQLAlchemy connection
+        """
+        if not self._pooled:
+            if (self._reconnect and not self._closed
+                    and self._raw_connection is not None
+                    and self._raw_connection.is_closed()):
+                self._reopen(self._raw_connection)
+            yield self._raw_connection if raw else self._connection
+            return
+        connection = self._retry(
+            'connect', self._alchemy_engine.connect, idempotent=True)
+        try:
+            yield connection.connection.connection if raw else connection
+        finally:
+            connection.close()
+
+    def execute_simple(self, sql: str, params=None, json_decoder='json',
+                       decode: bool = True, row_type: str = 'dict',
+                       orient: str = 'records', column_arrays: bool = False,
+                       batch_size: int = 10000, use_cache: bool = True,
+                       idempotent: bool = None):
         """
         Executes a single SQL statement, reads the result set into memory and
         returns an array of dictionaries. This method is for executing single
@@ -253,69 +616,363 @@ class SnowConn:
         connector execute() method found here: https://docs.snowflake.net/manuals/user-guide/python-connector-api.html#execute
 
         :param sql: string containing a single SQL statement
-        :return: array of dictionaries
+        :param params: parameters to bind to the statement, as a sequence or
+        a dictionary depending on the paramstyle of the connection. Binding
+        parameters instead of formatting them into the SQL protects against
+        SQL injection, and with the qmark or numeric paramstyle lets
+        snowflake reuse the compiled statement.
+        :param json_decoder: how to decode VARIANT, OBJECT and ARRAY values:
+        'json', 'orjson', 'auto' (orjson when installed) or a callable.
+        Note that orjson, while much faster, decodes integers wider than 64
+        bits as floats.
+        :param decode: if False, VARIANT, OBJECT and ARRAY values are left as
+        JSON strings
+        :param row_type: 'dict' or 'lazy'. Lazy rows are read-only mappings
+        that share one column index per result set and only decode VARIANT,
+        OBJECT and ARRAY values when they are accessed, which saves memory
+        and time when only a few columns of a wide result are used.
+        :param orient: 'records' returns a list with a dictionary per row,
+        'columns' returns a dictionary with a list per column
+        :param column_arrays: when orient is 'columns', return FLOAT columns
+        and NUMBER columns without decimals as array.array when they contain
+        no NULLs. These can be wrapped by numpy.frombuffer without a copy.
+        :param batch_size: when orient is 'columns', number of rows to fetch
+        from snowflake at once
+        :param use_cache: read from and write to the result cache, if it is
+        enabled (see enable_result_cache)
+        :param idempotent: whether the statement can be run again when it
+        fails with a transient error, if a retry policy is set. By default
+        only queries (SELECT, WITH, SHOW and DESCRIBE) are retried.
+        :return: array of dictionaries, or dictionary of arrays
+        """
+        if orient not in ('records', 'columns'):
+            raise ValueError(f"orient must be 'records' or 'columns', not {orient!r}")
+        with self._instrument('execute_simple', sql) as event, \
+                self.checkout(raw=True) as raw_connection:
+            cache_key = self._get_result_cache_key(
+                raw_connection, use_cache, sql, 'execute_simple', params,
+                json_decoder, decode, row_type, orient, column_arrays)
+            if cache_key is not None:
+                cached = self._result_cache.get(cache_key)
+                if cached is not MISSING:
+                    event.cached = True
+                    return cached
+
+            with event.phase('execute'):
+                results = self._run(
+                    'execute_simple', raw_connection,
+                    lambda raw_connection: self._execute_cursor(
+                        raw_connection, sql, params=params),
+                    sql, idempotent)
+            event.query_id = results.sfqid
+            result = self._fetch_result(
+                results, event, json_decoder, decode, row_type, orient,
+                column_arrays, batch_size)
+
+        if cache_key is not None:
+            self._result_cache.set(cache_key, result)
+        return result
+
+    def _fetch_result(self, cursor, event: QueryEvent, json_decoder='json',
+                      decode: bool = True, row_type: str = 'dict',
+                      orient: str = 'records', column_arrays: bool = False,
+                      batch_size: int = 10000):
+        """
+        Fetches the results of an executed cursor in the format of
+        execute_simple
+        """
+        if orient not in ('records', 'columns'):
+            raise ValueError(f"orient must be 'records' or 'columns', not {orient!r}")
+        description = cursor.description
+        if orient == 'columns':
+            with event.phase('fetch'):
+                result = make_columns(
+                    iter(lambda: cursor.fetchmany(batch_size), []),
+                    description, get_json_loads(json_decoder), decode,
+                    column_arrays)
+            event.rows = cursor.rowcount
+        else:
+            with event.phase('fetch'):
+                rows = cursor.fetchall()
+            with event.phase('decode'):
+                result = list(self._make_rows(
+                    rows, description, json_decoder, decode, row_type))
+            event.rows = len(result)
+        return result
+
+    def execute_iter(self, sql: str, params=None, batch_size: int = 10000,
+                     json_decoder='json', decode: bool = True,
+                     row_type: str = 'dict', idempotent: bool = None):
+        """
+        Executes a single SQL statement and lazily yields the rows of the
+        result set as dictionaries, in the same format as execute_simple.
+        Rows are fetched batch_size at a time, so arbitrarily large result
+        sets can be processed in bounded memory.
+
+        :param sql: string containing a single SQL statement
+        :param params: see execute_simple
+        :param batch_size: number of rows to fetch from snowflake at once
+        :param json_decoder: see execute_simple
+        :param decode: see execute_simple
+        :param row_type: see execute_simple
+        :param idempotent: see execute_simple
+        :return: generator of dictionaries
         """
-        types_to_parse = (5, 9, 10)
+        with self.checkout(raw=True) as raw_connection:
+            results = self._run(
+                'execute_iter', raw_connection,
+                lambda raw_connection: self._execute_cursor(
+                    raw_connection, sql, params=params),
+                sql, idempotent)
+            batches = iter(lambda: results.fetchmany(batch_size), [])
+            for batch in batches:
+                yield from self._make_rows(
+                    batch, results.description, json_decoder, decode,
+                    row_type)
+
+    @staticmethod
+    def _make_rows(rows, description, json_decoder, decode: bool,
+                   row_type: str):
+        loads = get_json_loads(json_decoder)
+        if row_type == 'lazy':
+            schema = RowSchema(description, loads, decode)
+            return (LazyRow(schema, row) for row in rows)
+        if row_type != 'dict':
+            raise ValueError(f"row_type must be 'dict' or 'lazy', not {row_type!r}")
+
+        names = [desc[0] for desc in description]
+        to_parse = get_columns_to_parse(description) if decode else []
+        if to_parse:
+            rows = decode_columns(rows, to_parse, loads)
+        return (dict(zip(names, row)) for row in rows)
+
+    @staticmethod
+    def _execute_cursor(raw_connection, sql: str, cursor_class=None,
+                        params=None):
+        import snowflake.connector
         try:
-            cursor = self._raw_connection.cursor(snowflake.connector.DictCursor)
-            results = cursor.execute(sql)
+            if cursor_class is None:
+                cursor = raw_connection.cursor()
+            else:
+                cursor = raw_connection.cursor(cursor_class)
+            return cursor.execute(sql, params)
         except snowflake.connector.errors.ProgrammingError as e:
             print(sql)
             raise e
 
-        to_parse = {
-            desc[0]
-            for desc in results.description
-            if desc[1] in types_to_parse
-        }
+    def execute_many(self, sql: str, seq_of_params, idempotent: bool = False):
+        """
+        Executes a single SQL statement once for every set of parameters,
+        for example to insert many rows with one INSERT statement. This is a
+        wrapper around the snowflake connector executemany() method found
+        here: https://docs.snowflake.com/en/developer-guide/python-connector/python-connector-api#executemany
 
-        return [
-            {
-                key: json.loads(value)
-                if key in to_parse and value is not None else value
-                for key, value in entry.items()
-            }
-            for entry in results
-        ]
+        With the default pyformat paramstyle the connector rewrites INSERTs
+        into a single multi-row INSERT. With the qmark or numeric paramstyle
+        the parameters are sent as arrays and bound by snowflake, which for
+        large lists are uploaded to a stage in bulk.
+
+        :param sql: string containing a single SQL statement
+        :param seq_of_params: list of parameter sequences or dictionaries
+        :param idempotent: whether the statement can be run again when it
+        fails with a transient error, if a retry policy is set
+        :return: cursor
+        """
+        import snowflake.connector
+        with self.checkout(raw=True) as raw_connection:
+            try:
+                return self._run(
+                    'execute_many', raw_connection,
+                    lambda raw_connection: raw_connection.cursor().executemany(
+                        sql, seq_of_params),
+                    sql, idempotent)
+            except snowflake.connector.errors.ProgrammingError as e:
+                print(sql)
+                raise e
 
-    def execute_string(self, sql: str, *args, **kwargs):
+    def submit(self, sql: str, params=None, idempotent: bool = None):
+        """
+        Submits a single SQL statement to snowflake without waiting for it to
+        finish, so that several queries can run at the same time.
+
+        handles = [conn.submit(sql) for sql in queries]
+        results = gather(handles)
+
+        :param sql: string containing a single SQL statement
+        :param params: see execute_simple
+        :param idempotent: see execute_simple
+        :return: QueryHandle
+        """
+        with self.checkout(raw=True) as raw_connection:
+            cursor = self._run(
+                'submit', raw_connection,
+                lambda raw_connection: self._submit_cursor(
+                    raw_connection, sql, params),
+                sql, idempotent)
+        return QueryHandle(self, cursor.sfqid, sql)
+
+    @staticmethod
+    def _submit_cursor(raw_connection, sql: str, params=None):
+        import snowflake.connector
+        cursor = raw_connection.cursor()
+        try:
+            cursor.execute_async(sql, params)
+        except snowflake.connector.errors.ProgrammingError as e:
+            print(sql)
+            raise e
+        return cursor
+
+    def execute_string(self, sql: str, *args, parallel: bool = False,
+                       max_concurrency: int = 4, idempotent: bool = False,
+                       **kwargs):
         """
         Executes a list of sql statements. This is a thin wrapper around the
         snowflake connector execute_string() method found here:
         https://docs.snowflake.net/manuals/user-guide/python-connector-api.html#execute_string
 
+        With parallel=True, statements that do not depend on each other run
+        concurrently. A statement waits for the earlier statements that write
+        a table it reads or writes, or that read a table it writes. Anything
+        that is not a query or a write to a table (USE, SET, ALTER SESSION,
+        CALL, PUT, ...) runs on its own, after everything before it and
+        before everything after it. Dependencies the analysis cannot see can
+        be declared with a comment inside the statement:
+        -- depends_on: table_a, table_b
+
         :param sql:
+        :param parallel: run independent statements concurrently
+        :param max_concurrency: maximum number of statements running at the
+        same time when parallel
+        :param idempotent: whether the whole script can be run again when it
+        fails with a transient error, if a retry policy is set
         :return: list of cursors
         """
-        try:
-            cursor_list = self._raw_connection.execute_string(
-                sql, *args, **kwargs)
-        except snowflake.connector.errors.ProgrammingError as e:
-            print(sql)
-            raise e
+        import snowflake.connector
+        with self._instrument('execute_string', sql) as event, \
+                self.checkout(raw=True) as raw_connection, \
+                event.phase('execute'):
+            try:
+                if parallel:
+                    cursor_list = self._run(
+                        'execute_string', raw_connection,
+                        lambda raw_connection: self._execute_parallel(
+                            raw_connection, io.StringIO(sql),
+                            max_concurrency),
+                        sql, idempotent)
+                else:
+                    cursor_list = self._run(
+                        'execute_string', raw_connection,
+                        lambda raw_connection: raw_connection.execute_string(
+                            sql, *args, **kwargs),
+                        sql, idempotent)
+            except snowflake.connector.errors.ProgrammingError as e:
+                print(sql)
+                raise e
+            event.query_id = [cursor.sfqid for cursor in cursor_list]
         return cursor_list
 
-    def execute_file(self, fname: str):
+    @staticmethod
+    def _execute_parallel(raw_connection, stream, max_concurrency: int):
+        from concurrent.futures import ThreadPoolExecutor
+        from snowflake.connector.util_text import split_statements
+
+        statements = [
+            statement
+            for statement, _ in split_statements(stream, remove_comments=False)
+        ]
+        plan = plan_statements(statements)
+        failed = threading.Event()
+
+        # statements run on their own cursor of the same connection so that
+        # they share the session (temporary tables, USE, ...). Dependencies
+        # are always submitted before the statements waiting on them, so the
+        # pool never fills up with statements waiting on queued ones.
+        def execute(statement, dependencies):
+            for dependency in dependencies:
+                dependency.result()
+            if failed.is_set():
+                raise _SkippedStatement()
+            try:
+                return raw_connection.cursor().execute(statement)
+            except Exception:
+                failed.set()
+                raise
+
+        with ThreadPoolExecutor(max_concurrency) as pool:
+            futures = []
+            for statement, dependencies in zip(statements, plan):
+                futures.append(pool.submit(
+                    execute, statement, [futures[j] for j in dependencies]))
+
+        errors = [
+            future.exception() for future in futures
+            if future.exception() is not None
+        ]
+        for error in errors:
+            if not isinstance(error, _SkippedStatement):
+                raise error
+        return [future.result() for future in futures]
+
+    def execute_file(self, fname: str, *args, stream: bool = False,
+                     **kwargs):
         """
         Given the path to filename, execute the contents of the file using
         self.execute_string
+
+        With stream=True the file is not read into memory as a whole. It is
+        read line by line and every statement is executed as soon as it is
+        complete, so very large files use little memory and the first
+        statement starts right away. A generator of cursors is returned,
+        which has to be consumed for the statements to run.
         :param fname: file path that can be open()ed
-        :return: list of cursors
+        :param stream: execute the statements while reading the file
+        :param args: forwarded on to execute_string
+        :param kwargs: forwarded on to execute_string, or on to the snowflake
+        connector execute_stream() when stream
+        :return: list of cursors, or a generator of cursors when stream
         """
+        if stream:
+            return self._execute_file_stream(fname, **kwargs)
         with open(fname) as fh:
             sql = fh.read()
-        return self.execute_string(sql)
+        return self.execute_string(sql, *args, **kwargs)
+
+    def _execute_file_stream(self, fname: str, **kwargs):
+        with self.checkout(raw=True) as raw_connection, open(fname) as fh:
+            yield from raw_connection.execute_stream(fh, **kwargs)
 
-    def read_df(self, sql: str, lowercase_columns: bool = True):
+    def read_df(self, sql: str, lowercase_columns: bool = True,
+                use_cache: bool = True, spill_to: str = None,
+                columns: List[str] = None, rename=None, dtype: dict = None,
+                dtype_backend: str = None, idempotent: bool = None):
         """
         Executes the sql passed in and reads the result into a pandas
         dataframe.
 
         If you want to use pandas, you'll have to install it yourself as it is
         not a requirement of this package due to its weight.
+
+        columns, rename, dtype and dtype_backend are applied to the Arrow
+        result before it is converted to pandas, so the dataframe is built
+        once, with the smallest footprint, instead of being copied by
+        DataFrame.astype() and friends afterwards.
         :param sql: string containing a single SQL statement
         :param lowercase_columns: boolean, wether or not to lowercase column names
         (snowflake connector fetch_pandas_all returns uppercase)
+        :param use_cache: read from and write to the result cache, if it is
+        enabled (see enable_result_cache)
+        :param spill_to: path of a file to stream the result to, see spill().
+        The dataframe is built from the memory-mapped file, sharing its memory
+        where the column types allow it.
+        :param columns: only keep these columns, after lowercasing
+        :param rename: dictionary or function to rename columns with, after
+        lowercasing
+        :param dtype: dictionary of column name (after renaming) to type, for
+        example {'price': 'float32', 'shop': 'category'}. Types can be numpy
+        dtypes or pyarrow DataTypes.
+        :param dtype_backend: 'pyarrow' to get pyarrow backed columns
+        (pandas.ArrowDtype) instead of numpy ones
+        :param idempotent: see execute_simple
         :return: pandas DataFrame
         """
         try:
@@ -323,16 +980,284 @@ class SnowConn:
         except ImportError as e:
             logging.warning('pandas not installed, cannot execute read_df')
             raise e
-        cursor = self._raw_connection.cursor(snowflake.connector.DictCursor)
-        cursor.execute(sql)
-        read_df = cursor.fetch_pandas_all()
+        convert = (columns, rename, dtype, dtype_backend) != (None,) * 4
+        if spill_to:
+            with self._instrument('read_df', sql) as event:
+                with event.phase('fetch'):
+                    table = self.spill(
+                        sql, spill_to, lowercase_columns, idempotent)
+                with event.phase('convert'):
+                    read_df = self._arrow_to_df(
+                        table, columns, rename, dtype, dtype_backend)
+                event.rows = len(read_df)
+                event.bytes = table.nbytes
+            return read_df
+        import snowflake.connector
+        with self._instrument('read_df', sql) as event:
+            with self.checkout(raw=True) as raw_connection:
+                cache_key = self._get_result_cache_key(
+                    raw_connection, use_cache, sql, 'read_df',
+                    lowercase_columns, columns, rename, dtype, dtype_backend)
+                if cache_key is not None:
+                    cached = self._result_cache.get(cache_key)
+                    if cached is not MISSING:
+                        event.cached = True
+                        return cached
+
+                with event.phase('execute'):
+                    cursor = self._run(
+                        'read_df', raw_connection,
+                        lambda raw_connection: raw_connection.cursor(
+                            snowflake.connector.DictCursor).execute(sql),
+                        sql, idempotent)
+                event.query_id = cursor.sfqid
+                fetched = self._fetch_df(
+                    cursor, event, lowercase_columns, convert)
+            # the connection is released before the conversion
+            read_df = self._finish_df(
+                fetched, event, lowercase_columns, columns, rename, dtype,
+                dtype_backend)
+            del fetched
+        if cache_key is not None:
+            self._result_cache.set(cache_key, read_df)
+        return read_df
+
+    @staticmethod
+    def _fetch_df(cursor, event: QueryEvent, lowercase_columns: bool,
+                  convert: bool):
+        """
+        Fetches the results of an executed cursor as an Arrow table, or
+        directly as a dataframe when no conversion options are given
+        """
+        if not convert:
+            # fetch_pandas_all fetches and converts in one go
+            with event.phase('fetch'):
+                return cursor.fetch_pandas_all()
+        import pyarrow as pa
+        names = [desc[0] for desc in cursor.description]
         if lowercase_columns:
-            read_df.columns = map(str.lower, read_df.columns)
+            names = [name.lower() for name in names]
+        with event.phase('fetch'):
+            table = cursor.fetch_arrow_all()
+        if table is None:
+            # fetch_arrow_all returns None for empty results
+            return pa.table(
+                [pa.array([], pa.null()) for _ in names], names=names)
+        return table.rename_columns(names)
+
+    def _finish_df(self, fetched, event: QueryEvent, lowercase_columns: bool,
+                   columns: List[str] = None, rename=None, dtype: dict = None,
+                   dtype_backend: str = None):
+        """
+        Turns the result of _fetch_df into the dataframe read_df returns
+        """
+        if (columns, rename, dtype, dtype_backend) != (None,) * 4:
+            with event.phase('convert'):
+                read_df = self._arrow_to_df(
+                    fetched, columns, rename, dtype, dtype_backend,
+                    self_destruct=True)
+        else:
+            read_df = fetched
+            if lowercase_columns:
+                read_df.columns = map(str.lower, read_df.columns)
+        event.rows = len(read_df)
+        event.bytes = int(read_df.memory_usage(index=False).sum())
         return read_df
 
+    @staticmethod
+    def _arrow_to_df(table, columns: List[str] = None, rename=None,
+                     dtype: dict = None, dtype_backend: str = None,
+                     self_destruct: bool = False):
+        import pandas as pd
+        import pyarrow as pa
+
+        if columns is not None:
+            table = table.select(columns)
+        if rename is not None:
+            table = table.rename_columns([
+                rename(name) if callable(rename) else rename.get(name, name)
+                for name in table.column_names
+            ])
+        for name, target in (dtype or {}).items():
+            i = table.schema.get_field_index(name)
+            if i == -1:
+                raise KeyError(f'column {name!r} not found in result')
+            column = table.column(i)
+            if isinstance(target, str) and target == 'category':
+                column = column.dictionary_encode()
+            elif isinstance(target, pa.DataType):
+                column = column.cast(target)
+            else:
+                import numpy as np
+                column = column.cast(pa.from_numpy_dtype(np.dtype(target)))
+            table = table.set_column(i, name, column)
+
+        kwargs = {'split_blocks': True, 'self_destruct': self_destruct}
+        if dtype_backend == 'pyarrow':
+            kwargs['types_mapper'] = pd.ArrowDtype
+        elif dtype_backend is not None:
+            raise ValueError(f"dtype_backend must be 'pyarrow' or None, not {dtype_backend!r}")
+        return table.to_pandas(**kwargs)
+
+    def read_arrow(self, sql: str, lowercase_columns: bool = True,
+                   spill_to: str = None, idempotent: bool = None):
+        """
+        Executes the sql passed in and reads the result into a pyarrow Table,
+        straight from the Arrow batches snowflake returns, without going
+        through pandas. Requires pyarrow.
+
+        :param sql: string containing a single SQL statement
+        :param lowercase_columns: boolean, wether or not to lowercase column
+        names
+        :param spill_to: path of a file to stream the result to, see spill()
+        :param idempotent: see execute_simple
+        :return: pyarrow Table
+        """
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            logging.warning('pyarrow not installed, cannot execute read_arrow')
+            raise e
+        if spill_to:
+            return self.spill(sql, spill_to, lowercase_columns, idempotent)
+        with self._instrument('read_arrow', sql) as event:
+            with self.checkout(raw=True) as raw_connection:
+                with event.phase('execute'):
+                    cursor = self._run(
+                        'read_arrow', raw_connection,
+                        lambda raw_connection: self._execute_cursor(
+                            raw_connection, sql),
+                        sql, idempotent)
+                event.query_id = cursor.sfqid
+                names = [desc[0] for desc in cursor.description]
+                if lowercase_columns:
+                    names = [name.lower() for name in names]
+                with event.phase('fetch'):
+                    table = cursor.fetch_arrow_all()
+            if table is None:
+                # fetch_arrow_all returns None for empty results
+                table = pa.table(
+                    [pa.array([], pa.null()) for _ in names], names=names)
+            else:
+                table = table.rename_columns(names)
+            event.rows = table.num_rows
+            event.bytes = table.nbytes
+        return table
+
+    def read_polars(self, sql: str, lowercase_columns: bool = True):
+        """
+        Executes the sql passed in and reads the result into a polars
+        DataFrame, built from the Arrow batches snowflake returns without
+        going through pandas. Requires polars and pyarrow.
+
+        :param sql: string containing a single SQL statement
+        :param lowercase_columns: boolean, wether or not to lowercase column
+        names
+        :return: polars DataFrame
+        """
+        try:
+            import polars as pl
+        except ImportError as e:
+            logging.warning('polars not installed, cannot execute read_polars')
+            raise e
+        return pl.from_arrow(self.read_arrow(sql, lowercase_columns))
+
+    def spill(self, sql: str, path: str, lowercase_columns: bool = True,
+              idempotent: bool = None):
+        """
+        Executes the sql passed in and streams the result, one chunk at a
+        time, into an Arrow IPC (Feather) file at path. The file is then
+        memory-mapped, so results much larger than memory can be used
+        without being downloaded again. Requires pyarrow.
+
+        :param sql: string containing a single SQL statement
+        :param path: path of the file to write, overwritten if it exists
+        :param lowercase_columns: boolean, wether or not to lowercase column
+        names
+        :param idempotent: see execute_simple
+        :return: memory-mapped pyarrow Table
+        """
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            logging.warning('pyarrow not installed, cannot execute spill')
+            raise e
+        with self.checkout(raw=True) as raw_connection:
+            cursor = self._run(
+                'spill', raw_connection,
+                lambda raw_connection: self._execute_cursor(
+                    raw_connection, sql),
+                sql, idempotent)
+            names = [desc[0] for desc in cursor.description]
+            if lowercase_columns:
+                names = [name.lower() for name in names]
+            writer = None
+            try:
+                for batch in cursor.fetch_arrow_batches():
+                    batch = batch.rename_columns(names)
+                    if writer is None:
+                        # snowflake picks the integer width per chunk, so
+                        # integers are widened to fit every chunk
+                        schema = pa.schema([
+                            field.with_type(pa.int64())
+                            if pa.types.is_integer(field.type) else field
+                            for field in batch.schema
+                        ])
+                        writer = pa.ipc.new_file(path, schema)
+                    if batch.schema != schema:
+                        batch = batch.cast(schema)
+                    writer.write_table(batch)
+                if writer is None:
+                    writer = pa.ipc.new_file(
+                        path, pa.schema([(name, pa.null()) for name in names]))
+            finally:
+                if writer is not None:
+                    writer.close()
+        return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+    def read_batches(self, sql: str, lowercase_columns: bool = True,
+                     as_arrow: bool = False, idempotent: bool = None):
+        """
+        Executes the sql passed in and lazily yields the result one chunk at a
+        time, as returned by snowflake, instead of reading it into a single
+        dataframe. Use this for results that do not fit into memory.
+
+        :param sql: string containing a single SQL statement
+        :param lowercase_columns: boolean, wether or not to lowercase column
+        names. Only the column labels are replaced, the data is not copied.
+        :param as_arrow: yield pyarrow Tables instead of pandas DataFrames
+        :param idempotent: see execute_simple
+        :return: generator of pandas DataFrames or pyarrow Tables
+        """
+        try:
+            import pandas as pd # noqa
+        except ImportError as e:
+            logging.warning('pandas not installed, cannot execute read_batches')
+            raise e
+        with self.checkout(raw=True) as raw_connection:
+            cursor = self._run(
+                'read_batches', raw_connection,
+                lambda raw_connection: self._execute_cursor(
+                    raw_connection, sql),
+                sql, idempotent)
+            if as_arrow:
+                for batch in cursor.fetch_arrow_batches():
+                    if lowercase_columns:
+                        batch = batch.rename_columns(
+                            [name.lower() for name in batch.column_names])
+                    yield batch
+            else:
+                for batch in cursor.fetch_pandas_batches():
+                    if lowercase_columns:
+                        batch.columns = map(str.lower, batch.columns)
+                    yield batch
+
     def write_df(self, df, table: str, schema=None, if_exists: str = 'replace',
                  index: bool = False, temporary_table=False,
-                 chunksize=5000, **kwargs):
+                 chunksize=5000, bulk: bool = False,
+                 bulk_chunksize: int = 500000, serialize_workers: int = None,
+                 upload_workers: int = 4, max_inflight_chunks: int = 8,
+                 **kwargs):
         """
         Writes a dataframe to the specified table. Note that you must be
         connected in the correct context for this to be able to work as you
@@ -349,9 +1274,34 @@ class SnowConn:
         :param index: forwarded on to DataFrame.to_sql
         :param temporary_table: Runs a bit of a hack to create temp tables
         :param chunksize: forwarded on to DataFrame.to_sql
+        :param bulk: instead of INSERTing the rows with DataFrame.to_sql,
+        write them to Parquet files, PUT those on a temporary stage and load
+        them with COPY INTO. This is much faster for large dataframes and
+        requires pyarrow. Of the DataFrame.to_sql arguments only dtype is
+        supported, to create the table with, and chunksize is replaced by
+        bulk_chunksize.
+        :param bulk_chunksize: number of rows per Parquet file when bulk
+        :param serialize_workers: number of processes writing Parquet files
+        when bulk, defaults to the number of CPUs. They are spawned rather
+        than forked, so scripts calling write_df(bulk=True) need an
+        if __name__ == '__main__': guard.
+        :param upload_workers: number of threads PUTting Parquet files when
+        bulk
+        :param max_inflight_chunks: maximum number of chunks being written or
+        uploaded at the same time when bulk, which bounds the memory and disk
+        space used
         :param kwargs: forwarded on to DataFrame.to_sql
         :return: None
         """
+        if bulk:
+            dtype = kwargs.pop('dtype', None)
+            unsupported = sorted(kwargs)
+            if chunksize != 5000:
+                unsupported.insert(0, 'chunksize')
+            if unsupported:
+                raise TypeError(
+                    f'write_df(bulk=True) does not support '
+                    f'{", ".join(unsupported)}')
 
         if schema:
             schema = schema.upper()
@@ -362,28 +1312,321 @@ class SnowConn:
                 + ('"' + table + '"')
         )
 
-        if not temporary_table:
-            df.to_sql(table, con=self._connection, schema=schema,
-                      if_exists=if_exists, index=index, chunksize=chunksize,
-                      **kwargs)
+        with self._instrument('write_df') as event, \
+                self.checkout() as connection:
+            event.rows = len(df)
+            if bulk:
+                self._write_df_bulk(
+                    connection, df, table, schema_table, if_exists, index,
+                    temporary_table, dtype, bulk_chunksize, serialize_workers,
+                    upload_workers, max_inflight_chunks, event)
+            elif not temporary_table:
+                with event.phase('insert'):
+                    df.to_sql(table, con=connection, schema=schema,
+                              if_exists=if_exists, index=index,
+                              chunksize=chunksize, **kwargs)
+            else:
+                import pandas as pd
+                sql = pd.io.sql.get_schema(
+                    df, name=table, con=connection
+                ).replace(f'CREATE TABLE "{table}"', f'CREATE OR REPLACE TEMPORARY TABLE {schema_table}')
+                # the temporary table only exists in the session that created
+                # it, so it has to be created on the connection used to write
+                with event.phase('create'):
+                    connection.connection.connection.cursor().execute(sql)
+                with event.phase('insert'):
+                    df.to_sql(table, con=connection, schema=schema,
+                              if_exists='append', index=index,
+                              chunksize=chunksize, **kwargs)
+
+    def _write_df_bulk(self, connection, df, table: str, schema_table: str,
+                       if_exists: str, index: bool, temporary_table: bool,
+                       dtype, chunksize: int, serialize_workers: int,
+                       upload_workers: int, max_inflight_chunks: int,
+                       event: QueryEvent):
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        import multiprocessing
+        import pandas as pd
+
+        if temporary_table:
+            create = 'CREATE OR REPLACE TEMPORARY TABLE'
+        elif if_exists == 'replace':
+            create = 'CREATE OR REPLACE TABLE'
+        elif if_exists == 'append':
+            create = 'CREATE TABLE IF NOT EXISTS'
+        elif if_exists == 'fail':
+            create = 'CREATE TABLE'
         else:
-            import pandas as pd
-            sql = pd.io.sql.get_schema(
-                df, name=table, con=self._connection
-            ).replace(f'CREATE TABLE "{table}"', f'CREATE OR REPLACE TEMPORARY TABLE {schema_table}')
-            self.execute_simple(sql)
-            df.to_sql(table, con=self._connection, schema=schema,
-                      if_exists='append', index=index, chunksize=chunksize,
-                      **kwargs)
+            raise ValueError(f"'{if_exists}' is not valid for if_exists")
+
+        if index:
+            df = df.reset_index()
+        create_sql = pd.io.sql.get_schema(
+            df, name=table, con=connection, dtype=dtype
+        ).replace(f'CREATE TABLE "{table}"', f'{create} {schema_table}')
+
+        # temporary tables and stages only exist in the session that created
+        # them, so everything runs on the same connection
+        raw_connection = connection.connection.connection
+        cursor = raw_connection.cursor()
+        stage = f'SNOWCONN_{uuid.uuid4().hex.upper()}'
+        with event.phase('create'):
+            cursor.execute(create_sql)
+            cursor.execute(f'CREATE TEMPORARY STAGE "{stage}"')
+
+        # chunks are written to Parquet in worker processes while the chunks
+        # that are done are PUT by a pool of threads. The semaphore is
+        # released once a chunk is uploaded and its file removed, so at most
+        # max_inflight_chunks chunks are held in memory and on disk.
+        inflight = threading.BoundedSemaphore(max_inflight_chunks)
+        failed = threading.Event()
+        stats_lock = threading.Lock()
+        stats = {'serialize_time': 0.0, 'upload_time': 0.0, 'bytes': 0}
+
+        def upload(path, serialized):
+            try:
+                serialize_time, size = serialized.result()
+                put_path = path.replace('\\', '\\\\').replace("'", "\\'")
+                started = time.perf_counter()
+                raw_connection.cursor().execute(
+                    f"PUT 'file://{put_path}' @\"{stage}\" AUTO_COMPRESS=FALSE")
+                upload_time = time.perf_counter() - started
+                with stats_lock:
+                    stats['serialize_time'] += serialize_time
+                    stats['upload_time'] += upload_time
+                    stats['bytes'] += size
+            except Exception:
+                failed.set()
+                raise
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+                inflight.release()
+
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                ProcessPoolExecutor(
+                    serialize_workers,
+                    # forking while the upload threads and the connector's
+                    # heartbeat thread run can deadlock the workers
+                    mp_context=multiprocessing.get_context('spawn'),
+                ) as serializers, \
+                ThreadPoolExecutor(upload_workers) as uploaders:
+            uploads = []
+            for n, start in enumerate(range(0, len(df), chunksize)):
+                inflight.acquire()
+                if failed.is_set():
+                    inflight.release()
+                    break
+                path = os.path.join(tmpdir, f'chunk_{n}.parquet')
+                serialized = serializers.submit(
+                    _write_parquet_chunk, df.iloc[start:start + chunksize], path)
+                uploads.append(uploaders.submit(upload, path, serialized))
+            for future in uploads:
+                future.result()
+        upload_done = time.perf_counter()
+
+        with event.phase('copy'):
+            cursor.execute(
+                f'COPY INTO {schema_table} FROM @"{stage}" '
+                'FILE_FORMAT=(TYPE=PARQUET COMPRESSION=AUTO) '
+                'MATCH_BY_COLUMN_NAME=CASE_INSENSITIVE PURGE=TRUE'
+            )
+        event.query_id = cursor.sfqid
+        done = time.perf_counter()
+        event.timings['upload'] = upload_done - started
+        event.bytes = stats['bytes']
+
+        megabytes = stats['bytes'] / 1e6
+        logging.info(
+            f'write_df {schema_table}: {len(df)} rows, {megabytes:.1f}MB in '
+            f'{len(uploads)} chunks. '
+            f'serialize: {stats["serialize_time"]:.2f}s '
+            f'({megabytes / max(stats["serialize_time"], 1e-9):.1f}MB/s per '
+            f'process), upload: {stats["upload_time"]:.2f}s '
+            f'({megabytes / max(stats["upload_time"], 1e-9):.1f}MB/s per '
+            f'thread), pipeline: {upload_done - started:.2f}s '
+            f'({len(df) / max(upload_done - started, 1e-9):.0f} rows/s), '
+            f'copy into: {done - upload_done:.2f}s'
+        )
+
+    def _retry(self, operation: str, fn, sql: str = None,
+               idempotent: bool = None):
+        if self._retry_policy is None:
+            return fn()
+        if idempotent is None:
+            idempotent = sql is not None and is_query(sql)
+        return self._retry_policy.call(fn, idempotent, operation)
+
+    def _run(self, operation: str, raw_connection, fn, sql: str = None,
+             idempotent: bool = None):
+        """
+        Calls fn(raw_connection) with the retry policy. When the session of
+        the connection held by this object expired, fn is called once more
+        on a new connection.
+        """
+        def attempt():
+            nonlocal raw_connection
+            try:
+                return fn(raw_connection)
+            except Exception as e:
+                if not (self._reconnect and not self._closed
+                        and raw_connection is self._raw_connection
+                        and (get_errno(e) in SESSION_EXPIRED_ERRNOS
+                             or raw_connection.is_closed())):
+                    raise
+                logging.warning(f'{operation} failed with {e!r}, reconnecting')
+                self._reopen(raw_connection)
+                if raw_connection is self._raw_connection:
+                    raise
+                raw_connection = self._raw_connection
+            return fn(raw_connection)
+        return self._retry(operation, attempt, sql, idempotent)
+
+    def _reopen(self, raw_connection):
+        with self._reconnect_lock:
+            if self._closed or raw_connection is not self._raw_connection:
+                # closed, or another thread reconnected already
+                return
+            logging.info('snowflake session closed or expired, reconnecting')
+            try:
+                # drop the connection instead of returning it to the pool
+                self._connection.invalidate()
+            except Exception as e:
+                logging.warning(f'could not invalidate connection: {e!r}')
+            # the credentials are part of the engine's URL, so they are not
+            # fetched again
+            self._connection = self._retry(
+                'connect', self._alchemy_engine.connect, idempotent=True)
+            self._raw_connection = self._connection.connection.connection
+
+    def add_hook(self, hook):
+        """
+        Registers a hook whose on_query_start and on_query_end methods are
+        called with a QueryEvent around every execute_simple, execute_string,
+        read_df, read_arrow and write_df call. See snowconn.instrumentation
+        for the LoggingHook and MetricsRegistry hooks.
+        :param hook: QueryHook
+        :return: None
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """
+        Unregisters a hook added with add_hook
+        :return: None
+        """
+        self._hooks.remove(hook)
+
+    @contextmanager
+    def _instrument(self, method: str, sql: str = None):
+        event = QueryEvent(method, sql)
+        self._call_hooks('on_query_start', event)
+        try:
+            yield event
+        except BaseException as e:
+            event.error = e
+            raise
+        finally:
+            event.finish()
+            self._call_hooks('on_query_end', event)
+
+    def _call_hooks(self, name: str, event: QueryEvent):
+        for hook in self._hooks:
+            try:
+                getattr(hook, name)(event)
+            except Exception:
+                # a broken hook must not break the query
+                logging.exception(f'{name} hook {hook!r} failed')
+
+    def enable_result_cache(self, ttl: float = 300,
+                            max_bytes: int = 256 * 2 ** 20,
+                            directory: str = None,
+                            cache: ResultCache = None):
+        """
+        Caches the results of execute_simple and read_df queries locally, so
+        that repeating a query does not run it in snowflake again. Results are
+        keyed by the SQL (ignoring differences in whitespace), its parameters,
+        the current database, schema and role, and the options of the call.
+        Only queries (SELECT, WITH, SHOW and DESCRIBE) are cached, and not
+        when an option is a function, such as read_df(rename=...) or
+        execute_simple(json_decoder=...).
+
+        Cached results can be stale by up to ttl seconds.
+
+        :param ttl: number of seconds a result stays valid
+        :param max_bytes: maximum size of the results kept in memory, the
+        least recently used results are evicted first
+        :param directory: also write results to this directory, DataFrames
+        as Parquet files, so that they survive the process
+        :param cache: use this ResultCache instead of creating one, for
+        example to share it between several SnowConns
+        :return: the ResultCache
+        """
+        self._result_cache = cache or ResultCache(ttl, max_bytes, directory)
+        return self._result_cache
+
+    def disable_result_cache(self):
+        """
+        Stops caching results
+        :return: None
+        """
+        self._result_cache = None
+
+    def _get_result_cache_key(self, raw_connection, use_cache: bool,
+                              sql: str, *options):
+        if self._result_cache is None or not use_cache or not is_query(sql):
+            return None
+        if not is_value(options):
+            # the result depends on a function, such as rename or
+            # json_decoder, that cannot be told apart from other functions
+            return None
+        return self._result_cache.make_key(
+            sql, raw_connection.database, raw_connection.schema,
+            raw_connection.role, *options)
 
     def close(self):
         """
         Close off the current connection and dispose() of the engine
         is not documented anywhere in snowflake.
+
+        If the engine comes from the engine cache, the connection is returned
+        to the pool and the engine is kept alive for reuse. Use evict_engine()
+        or clear_engine_cache() to dispose of it.
+        :return: None
+        """
+        self._closed = True
+        if self._connection is not None:
+            self._connection.close()
+        if self._engine_key is None:
+            self._alchemy_engine.dispose()
+
+    def evict_engine(self):
+        """
+        Removes the engine used by this connection from the engine cache and
+        dispose()s of it. Connections that are still checked out keep working
+        until they are closed.
+        :return: None
+        """
+        if self._engine_key is None:
+            return
+        with _engine_cache_lock:
+            engine = _engine_cache.pop(self._engine_key, None)
+        self._engine_key = None
+        if engine is not None:
+            engine.dispose()
+
+    @staticmethod
+    def clear_engine_cache():
+        """
+        Evicts and dispose()s of every engine in the engine cache
         :return: None
         """
-        self._connection.close()
-        self._alchemy_engine.dispose()
+        with _engine_cache_lock:
+            engines = list(_engine_cache.values())
+            _engine_cache.clear()
+        for engine in engines:
+            engine.dispose()
 
     def get_current_role(self):
         results = self.execute_simple('show roles;')
@@ -0,0 +1,197 @@
+"""
+Hooks to observe the queries run by SnowConn, see SnowConn.add_hook()
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from .result_cache import normalize_sql
+
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Returns a short hash of the SQL with its literals replaced, so that
+    queries that only differ in their values share a fingerprint
+    """
+    normalized = _LITERAL_RE.sub('?', normalize_sql(sql))
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+class QueryEvent:
+    """
+    Describes one call of a SnowConn method, passed to the hooks.
+
+    timings maps each phase to the seconds spent in it. Depending on the
+    method, phases are 'execute' (submitting the query and waiting for
+    snowflake to run it), 'fetch' (downloading the result), 'decode' (JSON
+    decoding of semi-structured values), 'convert' (building a DataFrame or
+    Table), and for write_df 'insert', 'create', 'upload' and 'copy'.
+    The server side breakdown of a query can be looked up by its query_id in
+    the QUERY_HISTORY views.
+    """
+
+    def __init__(self, method: str, sql: str = None):
+        self.method = method
+        self.sql = sql
+        self.fingerprint = fingerprint(sql) if sql else None
+        self.query_id = None
+        self.rows = None
+        self.bytes = None
+        self.cached = False
+        self.error = None
+        self.timings = {}
+        self.started = time.time()
+        self.duration = None
+        self._started = time.perf_counter()
+
+    def __repr__(self):
+        return (f'QueryEvent({self.method!r}, query_id={self.query_id!r}, '
+                f'duration={self.duration!r})')
+
+    @contextmanager
+    def phase(self, name: str):
+        """Adds the time spent in the with block to the given phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (
+                self.timings.get(name, 0.0) + time.perf_counter() - started)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+
+class QueryHook:
+    """
+    Base class of hooks, override the methods you need
+    """
+
+    def on_query_start(self, event: QueryEvent):
+        pass
+
+    def on_query_end(self, event: QueryEvent):
+        pass
+
+
+class LoggingHook(QueryHook):
+    """
+    Logs every finished query with its timings
+    """
+
+    def __init__(self, logger: logging.Logger = None,
+                 level: int = logging.INFO):
+        self.logger = logger or logging.getLogger('snowconn')
+        self.level = level
+
+    def on_query_end(self, event: QueryEvent):
+        timings = ' '.join(
+            f'{phase}={seconds:.3f}s'
+            for phase, seconds in event.timings.items()
+        )
+        status = 'error' if event.error is not None else (
+            'cached' if event.cached else 'ok')
+        self.logger.log(
+            self.level,
+            f'{event.method} {status} query_id={event.query_id} '
+            f'fingerprint={event.fingerprint} rows={event.rows} '
+            f'bytes={event.bytes} total={event.duration:.3f}s {timings}'
+        )
+
+
+class MetricsRegistry(QueryHook):
+    """
+    In-process registry of Prometheus style counters and histograms. As a
+    hook it records the queries, their duration per phase, and the rows and
+    bytes they returned. render() returns the metrics in the Prometheus text
+    exposition format, to be served by an HTTP endpoint of your choice.
+    """
+
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+               60, 120, 300, 600)
+
+    def __init__(self, prefix: str = 'snowconn'):
+        self.prefix = prefix
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict):
+        # label values are rendered as text, None as an empty label, and
+        # must be of one type to be sortable
+        return (name, tuple(sorted(
+            (k, '' if v is None else str(v)) for k, v in labels.items())))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increments a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, **labels):
+        """Adds an observation to a histogram"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # one count per bucket, then the sum and the total count
+                histogram = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def on_query_end(self, event: QueryEvent):
+        status = 'error' if event.error is not None else (
+            'cached' if event.cached else 'ok')
+        self.inc('queries_total', method=event.method, status=status)
+        self.observe('query_duration_seconds', event.duration,
+                     method=event.method)
+        for phase, seconds in event.timings.items():
+            self.observe('query_phase_seconds', seconds,
+                         method=event.method, phase=phase)
+        if event.rows is not None:
+            self.inc('rows_total', event.rows, method=event.method)
+        if event.bytes is not None:
+            self.inc('bytes_total', event.bytes, method=event.method)
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format"""
+        def labels_text(labels, extra=()):
+            labels = tuple(labels) + tuple(extra)
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        seen = set()
+        for (name, labels), value in counters:
+            name = f'{self.prefix}_{name}'
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name}{labels_text(labels)} {value!r}')
+        for (name, labels), histogram in histograms:
+            name = f'{self.prefix}_{name}'
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} histogram')
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(
+                    f'{name}_bucket{labels_text(labels, [("le", f"{bound:g}")])} {count}')
+            lines.append(
+                f'{name}_bucket{labels_text(labels, [("le", "+Inf")])} {histogram[-1]}')
+            lines.append(f'{name}_sum{labels_text(labels)} {histogram[-2]!r}')
+            lines.append(f'{name}_count{labels_text(labels)} {histogram[-1]}')
+        return '\n'.join(lines) + '\n'
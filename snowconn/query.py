@@ -0,0 +1,149 @@
+"""
+Handles to queries that were submitted to snowflake without waiting for them
+to finish, see SnowConn.submit()
+"""
+from contextlib import contextmanager
+import time
+from typing import List
+
+from .instrumentation import QueryEvent
+
+
+class QueryHandle:
+    """
+    Handle to a query that runs asynchronously in snowflake. The query keeps
+    running when the handle is garbage collected, use cancel() to stop it.
+    """
+
+    def __init__(self, conn, query_id: str, sql: str):
+        self._conn = conn
+        self.query_id = query_id
+        self.sql = sql
+
+    def __repr__(self):
+        return f'QueryHandle({self.query_id!r})'
+
+    def status(self):
+        """
+        Returns the current status of the query, as a
+        snowflake.connector.constants.QueryStatus
+        """
+        with self._conn.checkout(raw=True) as raw_connection:
+            return raw_connection.get_query_status(self.query_id)
+
+    def is_running(self) -> bool:
+        """
+        Returns whether the query is still queued or running. Raises if the
+        query failed.
+        """
+        with self._conn.checkout(raw=True) as raw_connection:
+            status = raw_connection.get_query_status_throw_if_error(
+                self.query_id)
+            return raw_connection.is_still_running(status)
+
+    def wait(self, timeout: float = None, poll_interval: float = 0.1,
+             max_poll_interval: float = 5.0):
+        """
+        Blocks until the query is done, polling its status with an
+        exponentially growing interval.
+
+        :param timeout: number of seconds after which TimeoutError is raised,
+        wait forever if None
+        :param poll_interval: initial number of seconds between polls
+        :param max_poll_interval: maximum number of seconds between polls
+        :return: None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.is_running():
+            sleep = poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f'query {self.query_id} did not finish in {timeout}s')
+                sleep = min(sleep, remaining)
+            time.sleep(sleep)
+            poll_interval = min(poll_interval * 2, max_poll_interval)
+
+    @contextmanager
+    def cursor(self, timeout: float = None):
+        """
+        Waits for the query to finish and yields a snowflake connector cursor
+        holding its results. The results are fetched lazily on the connection
+        the cursor was created on, so fetch them inside the with block, while
+        the connection is checked out:
+
+        with handle.cursor() as cursor:
+            rows = cursor.fetchall()
+        """
+        import snowflake.connector
+        self.wait(timeout)
+        with self._conn.checkout(raw=True) as raw_connection:
+            cursor = raw_connection.cursor()
+            try:
+                cursor.get_results_from_sfqid(self.query_id)
+            except snowflake.connector.errors.ProgrammingError as e:
+                print(self.sql)
+                raise e
+            yield cursor
+
+    def result(self, timeout: float = None, json_decoder='json',
+               decode: bool = True, row_type: str = 'dict',
+               orient: str = 'records', column_arrays: bool = False,
+               batch_size: int = 10000, event: QueryEvent = None):
+        """
+        Waits for the query to finish and returns its results in the same
+        format as SnowConn.execute_simple, see there for the options
+        :param event: QueryEvent to record the fetch in
+        """
+        with self.cursor(timeout) as cursor:
+            return self._conn._fetch_result(
+                cursor, event or QueryEvent('result'), json_decoder, decode,
+                row_type, orient, column_arrays, batch_size)
+
+    def result_df(self, timeout: float = None, lowercase_columns: bool = True,
+                  columns: List[str] = None, rename=None, dtype: dict = None,
+                  dtype_backend: str = None, event: QueryEvent = None):
+        """
+        Waits for the query to finish and returns its results in a pandas
+        dataframe, in the same format as SnowConn.read_df, see there for the
+        options
+        :param event: QueryEvent to record the fetch and conversion in
+        """
+        event = event or QueryEvent('result_df')
+        convert = (columns, rename, dtype, dtype_backend) != (None,) * 4
+        with self.cursor(timeout) as cursor:
+            fetched = self._conn._fetch_df(
+                cursor, event, lowercase_columns, convert)
+        return self._conn._finish_df(
+            fetched, event, lowercase_columns, columns, rename, dtype,
+            dtype_backend)
+
+    def cancel(self):
+        """
+        Cancels the query
+        :return: None
+        """
+        with self._conn.checkout(raw=True) as raw_connection:
+            raw_connection.cursor().execute(
+                f"SELECT SYSTEM$CANCEL_QUERY('{self.query_id}')")
+
+
+def gather(handles, timeout: float = None, **kwargs):
+    """
+    Waits for all queries to finish and returns their results, in the same
+    order as the handles
+
+    :param handles: list of QueryHandles
+    :param timeout: number of seconds to wait for all queries together
+    :param kwargs: forwarded on to QueryHandle.result
+    :return: list of results
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    results = []
+    for handle in handles:
+        remaining = None
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0)
+        results.append(handle.result(remaining, **kwargs))
+    return results
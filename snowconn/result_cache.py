@@ -0,0 +1,239 @@
+"""
+Local cache of query results, see SnowConn.enable_result_cache()
+"""
+from collections import OrderedDict
+import datetime
+import decimal
+import hashlib
+import logging
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+
+_LITERAL_RE = re.compile(r"('(?:[^'\\]|\\.|'')*')")
+_QUERY_RE = re.compile(r'^\s*\(*\s*(?:SELECT|WITH|SHOW|DESC|DESCRIBE)\b',
+                       re.IGNORECASE)
+
+MISSING = object()
+
+_VALUE_TYPES = (type(None), bool, int, float, complex, str, bytes,
+                decimal.Decimal, datetime.date, datetime.time,
+                datetime.timedelta)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Collapses whitespace outside of string literals and strips trailing
+    semicolons, so that trivially different spellings of a query share a
+    cache entry
+    """
+    parts = _LITERAL_RE.split(sql.strip().rstrip(';').strip())
+    return ''.join(
+        part if i % 2 else re.sub(r'\s+', ' ', part)
+        for i, part in enumerate(parts)
+    )
+
+
+def is_query(sql: str) -> bool:
+    """Returns whether the statement only reads data and can be cached"""
+    return bool(_QUERY_RE.match(sql))
+
+
+def is_value(value) -> bool:
+    """
+    Returns whether the repr of an option identifies its value, so that it
+    can be part of a cache key. Functions, lambdas and other objects whose
+    repr is their memory address are not values: two different lambdas can
+    share a repr, so results depending on them are not cached.
+    """
+    if isinstance(value, _VALUE_TYPES):
+        return True
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return all(is_value(item) for item in value)
+    if isinstance(value, dict):
+        return all(is_value(k) and is_value(v) for k, v in value.items())
+    if isinstance(value, type):
+        # classes, such as numpy.float32, are identified by their name
+        return True
+    # dtypes and other objects with a repr of their value
+    return not callable(value) and ' at 0x' not in repr(value)
+
+
+class ResultCache:
+    """
+    Thread-safe cache of query results with a time to live.
+
+    Results are kept pickled in memory, and the least recently used ones are
+    evicted once they take more than max_bytes. When a directory is given,
+    results are also written to disk, DataFrames as Parquet files and other
+    results pickled, so that they survive the process and can be shared by
+    several processes. Results on disk are not bounded by max_bytes, expired
+    ones are removed whenever a result is written. Failing to write a result
+    to disk is logged and does not fail the query.
+
+    :param ttl: number of seconds a result stays valid
+    :param max_bytes: maximum size of the results kept in memory
+    :param directory: directory to write results to, in memory only if None
+    """
+
+    def __init__(self, ttl: float = 300, max_bytes: int = 256 * 2 ** 20,
+                 directory: str = None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(sql: str, *context) -> str:
+        """
+        Returns the cache key of a query
+
+        :param sql: the SQL of the query
+        :param context: anything else the result depends on, such as the
+        current database, schema and role and the options of the call. Only
+        values (see is_value) identify a result.
+        """
+        return hashlib.sha256(
+            repr((normalize_sql(sql),) + context).encode('utf-8')
+        ).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the cached result, or MISSING
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, data = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return pickle.loads(data)
+                self._remove(key)
+
+        if self.directory:
+            for path in self._paths(key):
+                try:
+                    if os.path.getmtime(path) + self.ttl <= now:
+                        continue
+                    if path.endswith('.parquet'):
+                        import pandas as pd
+                        return pd.read_parquet(path)
+                    with open(path, 'rb') as fh:
+                        return pickle.load(fh)
+                except FileNotFoundError:
+                    continue
+        return MISSING
+
+    def set(self, key: str, value):
+        """
+        Caches a result. Results that cannot be pickled are not cached.
+        """
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logging.debug(f'not caching result: {e}')
+            return
+
+        if len(data) <= self.max_bytes:
+            with self._lock:
+                self._remove(key)
+                self._entries[key] = (time.time() + self.ttl, data)
+                self._bytes += len(data)
+                while self._bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+
+        if self.directory:
+            self._prune_directory()
+            parquet_path, pickle_path = self._paths(key)
+            if hasattr(value, 'to_parquet'):
+                try:
+                    self._write_file(parquet_path, value.to_parquet)
+                    return
+                except Exception as e:
+                    # for example object columns of mixed types
+                    logging.debug(f'not caching result as Parquet: {e}')
+            try:
+                self._write_file(
+                    pickle_path, lambda path: _write_bytes(path, data))
+            except OSError as e:
+                logging.warning(f'not caching result on disk: {e}')
+
+    def _write_file(self, path: str, write):
+        # write to a temporary file of our own first so that other threads
+        # and processes never read a partially written result
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _prune_directory(self):
+        # results on disk are only read within their ttl, so expired ones,
+        # and temporary files left behind by crashed processes, are removed
+        now = time.time()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(('.parquet', '.pickle', '.tmp')):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) + self.ttl <= now:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def invalidate(self, key: str = None):
+        """
+        Drops a result from the cache, or all results if key is None
+        """
+        with self._lock:
+            keys = [key] if key is not None else list(self._entries)
+            for k in keys:
+                self._remove(k)
+        if self.directory:
+            if key is None:
+                paths = [
+                    os.path.join(self.directory, name)
+                    for name in os.listdir(self.directory)
+                    if name.endswith(('.parquet', '.pickle'))
+                ]
+            else:
+                paths = self._paths(key)
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _paths(self, key: str):
+        return (
+            os.path.join(self.directory, f'{key}.parquet'),
+            os.path.join(self.directory, f'{key}.pickle'),
+        )
+
+
+def _write_bytes(path: str, data: bytes):
+    with open(path, 'wb') as fh:
+        fh.write(data)
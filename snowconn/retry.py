@@ -0,0 +1,206 @@
+"""
+Retrying of transient failures with exponential backoff, and a circuit
+breaker that fails fast while snowflake is unreachable, see
+SnowConn.connect(retry_policy=...)
+"""
+import logging
+import random
+import threading
+import time
+
+# snowflake connector and server error numbers of failures that are worth
+# retrying: failed to connect (250001), failed HTTP request, including
+# throttling and 5xx responses (250003), session expired (390112) and
+# authentication token expired (390114)
+RETRYABLE_ERRNOS = frozenset((250001, 250003, 390112, 390114))
+
+# error numbers of a session that expired (390112) or whose token expired
+# (390114) and can no longer be used: the connection has to be reopened
+SESSION_EXPIRED_ERRNOS = frozenset((390112, 390114))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling snowflake while the circuit is open"""
+
+
+def get_errno(error: BaseException):
+    """
+    Returns the snowflake error number of an exception, looking through the
+    SQLAlchemy exceptions that wrap connector exceptions, or None
+    """
+    while error is not None:
+        errno = getattr(error, 'errno', None)
+        if isinstance(errno, int):
+            return errno
+        error = getattr(error, 'orig', None)
+    return None
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker. After failure_threshold consecutive
+    retryable failures the circuit opens and every call raises
+    CircuitOpenError for reset_timeout seconds. Then one call is let through:
+    when it succeeds the circuit closes again, when it fails it stays open
+    for another reset_timeout seconds.
+
+    Share one CircuitBreaker between the SnowConns of an account so that they
+    all stop calling it while it is down.
+
+    :param failure_threshold: number of consecutive failures opening the
+    circuit
+    :param reset_timeout: number of seconds the circuit stays open
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'CircuitBreaker(state={self.state!r})'
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half_open'"""
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return 'open'
+            return 'half_open'
+
+    def before_call(self):
+        """Raises CircuitOpenError when the call must not be made"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining <= 0 and not self._probing:
+                self._probing = True
+                return
+        raise CircuitOpenError(
+            f'circuit open after {self._failures} consecutive failures, '
+            f'retry in {max(remaining, 0):.1f}s')
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def reset(self):
+        """Closes the circuit"""
+        self.record_success()
+
+
+class RetryPolicy:
+    """
+    Retries calls that fail with a transient error, waiting
+    min(max_delay, initial_delay * multiplier ** retry) seconds between
+    attempts. With jitter the wait is a random fraction of that ("full
+    jitter"), so that many clients failing at the same time do not all retry
+    at the same time.
+
+    Calls that are not idempotent are never retried, because snowflake may
+    have run the statement before the failure, but they still go through the
+    circuit breaker.
+
+    :param max_attempts: maximum number of attempts, including the first one
+    :param initial_delay: seconds to wait before the first retry
+    :param max_delay: maximum number of seconds to wait between attempts
+    :param multiplier: factor the delay grows with after every retry
+    :param jitter: randomize the delays
+    :param retryable_errnos: snowflake error numbers to retry, on top of
+    connection errors and timeouts
+    :param circuit_breaker: optional CircuitBreaker
+    :param metrics: optional MetricsRegistry to count the retries
+    (retries_total), their delays (retry_delay_seconds) and the calls
+    rejected by the circuit breaker (circuit_open_total)
+    """
+
+    def __init__(self, max_attempts: int = 3, initial_delay: float = 0.5,
+                 max_delay: float = 30, multiplier: float = 2,
+                 jitter: bool = True,
+                 retryable_errnos=RETRYABLE_ERRNOS,
+                 circuit_breaker: CircuitBreaker = None, metrics=None):
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retryable_errnos = frozenset(retryable_errnos)
+        self.circuit_breaker = circuit_breaker
+        self.metrics = metrics
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """Returns whether the exception is a transient failure"""
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        return get_errno(error) in self.retryable_errnos
+
+    def get_delay(self, retry: int) -> float:
+        """Returns the number of seconds to wait before the given retry"""
+        delay = min(self.max_delay,
+                    self.initial_delay * self.multiplier ** retry)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def call(self, fn, idempotent: bool = True, operation: str = 'query'):
+        """
+        Calls fn until it succeeds, fails with an error that is not
+        retryable, or max_attempts is reached.
+        :param fn: function without arguments
+        :param idempotent: whether fn can safely be called again
+        :param operation: name of the operation, for logging and metrics
+        :return: the result of fn
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.circuit_breaker is not None:
+                try:
+                    self.circuit_breaker.before_call()
+                except CircuitOpenError:
+                    if self.metrics is not None:
+                        self.metrics.inc('circuit_open_total',
+                                         operation=operation)
+                    raise
+            try:
+                result = fn()
+            except Exception as e:
+                retryable = self.is_retryable(e)
+                if self.circuit_breaker is not None:
+                    # any other error means that snowflake is reachable
+                    if retryable:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                if (not retryable or not idempotent
+                        or attempt >= self.max_attempts):
+                    raise
+                delay = self.get_delay(attempt - 1)
+                logging.warning(
+                    f'{operation} failed with {e!r}, retry {attempt} of '
+                    f'{self.max_attempts - 1} in {delay:.2f}s')
+                if self.metrics is not None:
+                    self.metrics.inc('retries_total', operation=operation,
+                                     errno=get_errno(e))
+                    self.metrics.observe('retry_delay_seconds', delay,
+                                         operation=operation)
+                time.sleep(delay)
+                continue
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_success()
+            return result
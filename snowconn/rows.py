@@ -0,0 +1,171 @@
+"""
+Helpers to turn the rows returned by the snowflake connector into python
+values.
+"""
+from array import array
+from collections.abc import Mapping
+import json
+
+# type codes of the VARIANT, OBJECT and ARRAY columns, whose values the
+# snowflake connector returns as JSON strings
+TYPES_TO_PARSE = (5, 9, 10)
+
+
+def get_json_loads(json_decoder='json'):
+    """
+    Returns the function used to decode VARIANT, OBJECT and ARRAY values.
+
+    :param json_decoder: 'json' for the standard library, 'orjson' for
+    orjson, 'auto' to use orjson when it is installed, or any callable that
+    takes a JSON string.
+    :return: function that takes a JSON string
+    """
+    if callable(json_decoder):
+        return json_decoder
+    if json_decoder == 'json':
+        return json.loads
+    if json_decoder == 'orjson':
+        import orjson
+        return orjson.loads
+    if json_decoder == 'auto':
+        try:
+            import orjson
+        except ImportError:
+            return json.loads
+
+        def loads(value):
+            try:
+                return orjson.loads(value)
+            except orjson.JSONDecodeError:
+                # orjson rejects some documents the standard library
+                # accepts, such as NaN
+                return json.loads(value)
+
+        return loads
+    raise ValueError(
+        f"json_decoder must be 'auto', 'json', 'orjson' or a callable, "
+        f"not {json_decoder!r}")
+
+
+def get_columns_to_parse(description):
+    """
+    Returns the positions of the VARIANT, OBJECT and ARRAY columns of a
+    result set
+    """
+    return [
+        i
+        for i, desc in enumerate(description)
+        if desc[1] in TYPES_TO_PARSE
+    ]
+
+
+def decode_columns(rows, columns, loads):
+    """
+    Decodes the JSON values of the given columns, one column at a time.
+
+    :param rows: list of tuples as returned by the connector
+    :param columns: positions of the columns to decode
+    :param loads: function that takes a JSON string
+    :return: list of lists
+    """
+    rows = [list(row) for row in rows]
+    for i in columns:
+        for row in rows:
+            value = row[i]
+            if value is not None:
+                row[i] = loads(value)
+    return rows
+
+
+class RowSchema:
+    """
+    Column index shared by all the LazyRows of a result set
+    """
+    __slots__ = ('index', 'to_parse', 'loads')
+
+    def __init__(self, description, loads, decode: bool = True):
+        self.index = {desc[0]: i for i, desc in enumerate(description)}
+        self.to_parse = (
+            frozenset(get_columns_to_parse(description)) if decode
+            else frozenset()
+        )
+        self.loads = loads
+
+
+class LazyRow(Mapping):
+    """
+    Read-only mapping of column name to value, backed by the tuple returned
+    by the connector. VARIANT, OBJECT and ARRAY values are only decoded when
+    they are first accessed, after which the decoded value is kept.
+    """
+    __slots__ = ('_schema', '_values', '_decoded')
+
+    def __init__(self, schema: RowSchema, values):
+        self._schema = schema
+        self._values = values
+        # bit i is set once column i has been decoded
+        self._decoded = 0
+
+    def __getitem__(self, key):
+        i = self._schema.index[key]
+        value = self._values[i]
+        if i in self._schema.to_parse and not self._decoded >> i & 1:
+            if value is not None:
+                if isinstance(self._values, tuple):
+                    self._values = list(self._values)
+                value = self._values[i] = self._schema.loads(value)
+            self._decoded |= 1 << i
+        return value
+
+    def __iter__(self):
+        return iter(self._schema.index)
+
+    def __len__(self):
+        return len(self._schema.index)
+
+    def __repr__(self):
+        return f'LazyRow({dict(self)!r})'
+
+
+def make_columns(batches, description, loads, decode: bool = True,
+                 arrays: bool = False):
+    """
+    Builds a dictionary of column name to list of values from batches of
+    rows, without building an object per row.
+
+    :param batches: iterable of lists of tuples as returned by the connector
+    :param description: cursor description of the result set
+    :param loads: function used to decode VARIANT, OBJECT and ARRAY values
+    :param decode: if False, VARIANT, OBJECT and ARRAY values are left as
+    JSON strings
+    :param arrays: convert FLOAT columns and NUMBER columns without decimals
+    to array.array when they contain no NULLs
+    :return: dictionary of lists (or array.arrays)
+    """
+    columns = [[] for _ in description]
+    for batch in batches:
+        for column, values in zip(columns, zip(*batch)):
+            column.extend(values)
+
+    if decode:
+        for i in get_columns_to_parse(description):
+            columns[i] = [
+                loads(value) if value is not None else None
+                for value in columns[i]
+            ]
+
+    if arrays:
+        for i, desc in enumerate(description):
+            if desc[1] == 1:
+                typecode = 'd'
+            elif desc[1] == 0 and desc[5] == 0:
+                typecode = 'q'
+            else:
+                continue
+            try:
+                columns[i] = array(typecode, columns[i])
+            except (TypeError, OverflowError):
+                # NULLs, or integers that do not fit in 64 bits
+                pass
+
+    return {desc[0]: column for desc, column in zip(description, columns)}
@@ -0,0 +1,158 @@
+"""
+Dependency analysis of the statements of a SQL script, used to run the
+independent statements of a script concurrently, see
+SnowConn.execute_string(parallel=True)
+"""
+import re
+
+_IDENTIFIER = r'((?:"[^"]+"|[\w$]+)(?:\s*\.\s*(?:"[^"]+"|[\w$]+))*)'
+
+_WRITE_RE = re.compile(
+    r'\b(?:'
+    r'CREATE(?:\s+OR\s+REPLACE)?'
+    r'(?:\s+(?:LOCAL\s+|GLOBAL\s+)?(?:TEMP|TEMPORARY|VOLATILE|TRANSIENT))?'
+    r'\s+(?:TABLE|VIEW|SECURE\s+VIEW|MATERIALIZED\s+VIEW)'
+    r'(?:\s+IF\s+NOT\s+EXISTS)?'
+    r'|INSERT\s+(?:OVERWRITE\s+)?INTO'
+    r'|UPDATE'
+    r'|DELETE\s+FROM'
+    r'|MERGE\s+INTO'
+    r'|TRUNCATE(?:\s+TABLE)?(?:\s+IF\s+EXISTS)?'
+    r'|DROP\s+(?:TABLE|VIEW)(?:\s+IF\s+EXISTS)?'
+    r'|ALTER\s+(?:TABLE|VIEW)(?:\s+IF\s+EXISTS)?'
+    r'|COPY\s+INTO'
+    r')\s+' + _IDENTIFIER,
+    re.IGNORECASE,
+)
+# the other table an ALTER TABLE/VIEW writes: the new name of a rename, or
+# the table swapped with
+_ALTER_TARGET_RE = re.compile(
+    r'^\s*ALTER\s+(?:TABLE|VIEW)\b.*?\b(?:RENAME\s+TO|SWAP\s+WITH)\s+'
+    + _IDENTIFIER,
+    re.IGNORECASE | re.DOTALL,
+)
+_READ_RE = re.compile(
+    r'\b(FROM|JOIN|USING|CLONE|LIKE)\s+' + _IDENTIFIER, re.IGNORECASE)
+# the alias of a table in a FROM list, and the comma starting the next table
+_ALIAS_RE = re.compile(r'\s+(?:AS\s+)?("[^"]+"|[\w$]+)', re.IGNORECASE)
+_NEXT_TABLE_RE = re.compile(
+    r'\s*,\s*(?!(?:LATERAL|TABLE)\b)' + _IDENTIFIER + r'(?![\w$".]|\s*\()',
+    re.IGNORECASE)
+_COMMA_RE = re.compile(r'\s*,')
+# words that can follow a table in a FROM list and are not its alias
+_NOT_ALIASES = frozenset((
+    'ASOF', 'AT', 'BEFORE', 'CHANGES', 'CONNECT', 'CROSS', 'EXCEPT', 'FETCH',
+    'FULL', 'GROUP', 'HAVING', 'INNER', 'INTERSECT', 'JOIN', 'LATERAL',
+    'LEFT', 'LIMIT', 'MATCH_RECOGNIZE', 'MINUS', 'NATURAL', 'OFFSET', 'ON',
+    'ORDER', 'OUTER', 'PIVOT', 'QUALIFY', 'RIGHT', 'SAMPLE', 'SET', 'START',
+    'TABLESAMPLE', 'UNION', 'UNPIVOT', 'USING', 'WHEN', 'WHERE', 'WINDOW',
+))
+_QUERY_RE = re.compile(r'^\s*\(*\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+_DEPENDS_ON_RE = re.compile(
+    r'--\s*depends[_ ]on\s*:\s*(.*)$', re.IGNORECASE | re.MULTILINE)
+# literals and comments in one alternation, so that they are found left to
+# right: a quote in a comment or -- in a literal starts nothing
+_LITERAL_OR_COMMENT_RE = re.compile(
+    r"('(?:[^'\\]|\\.|'')*'|\$\$.*?\$\$)|--[^\n]*|//[^\n]*|/\*.*?\*/",
+    re.DOTALL)
+
+
+def _normalize(identifier: str) -> str:
+    # only the last part of the name is kept so that qualified and
+    # unqualified references to the same table are seen as the same table,
+    # at the cost of also matching tables of the same name in other schemas
+    name = re.split(r'\s*\.\s*(?=(?:"[^"]+"|[\w$]+)$)', identifier)[-1]
+    if name.startswith('"'):
+        return name[1:-1]
+    return name.upper()
+
+
+def _strip(sql: str) -> str:
+    # literals are replaced by an empty literal and comments by a space
+    return _LITERAL_OR_COMMENT_RE.sub(
+        lambda match: "''" if match.group(1) else ' ', sql)
+
+
+def _read_tables(code: str):
+    """
+    Returns the tables read by a statement, or None when a comma separated
+    FROM or USING list cannot be followed to its end
+    """
+    tables = set()
+    for match in _READ_RE.finditer(code):
+        tables.add(_normalize(match.group(2)))
+        if match.group(1).upper() not in ('FROM', 'USING'):
+            continue
+        pos = match.end()
+        while True:
+            alias = _ALIAS_RE.match(code, pos)
+            if alias and alias.group(1).upper() not in _NOT_ALIASES:
+                pos = alias.end()
+            if not _COMMA_RE.match(code, pos):
+                break
+            # another table of the list. Subqueries and table functions
+            # would need a parser, their tables are not all known then
+            following = _NEXT_TABLE_RE.match(code, pos)
+            if following is None:
+                return None
+            tables.add(_normalize(following.group(1)))
+            pos = following.end()
+    return tables
+
+
+def analyze_statement(sql: str):
+    """
+    Finds the tables a statement reads and writes.
+
+    Statements that are not recognised as queries or as writing to a table
+    (USE, SET, ALTER SESSION, CALL, BEGIN, PUT, ...) are barriers: they may
+    change the session or touch any table, so they run on their own. So are
+    statements with a FROM list whose tables cannot all be found, such as
+    FROM a, LATERAL FLATTEN(...).
+
+    An explicit dependency can be declared with a comment in the statement:
+    -- depends_on: table_a, table_b
+
+    :param sql: a single SQL statement
+    :return: tuple of (set of tables read, set of tables written, barrier)
+    """
+    reads = {
+        _normalize(name.strip())
+        for line in _DEPENDS_ON_RE.findall(sql)
+        for name in line.split(',')
+        if name.strip()
+    }
+    code = _strip(sql)
+    writes = {_normalize(name) for name in _WRITE_RE.findall(code)}
+    writes |= {_normalize(name) for name in _ALTER_TARGET_RE.findall(code)}
+    tables = _read_tables(code)
+    if tables is None:
+        return reads, writes, True
+    reads |= tables
+    barrier = not writes and not _QUERY_RE.match(code)
+    return reads, writes, barrier
+
+
+def plan_statements(statements):
+    """
+    Computes which earlier statements each statement has to wait for. A
+    statement depends on an earlier one when either is a barrier, when it
+    reads or writes a table the earlier one writes, or when it writes a table
+    the earlier one reads.
+
+    :param statements: list of SQL statements
+    :return: list with, for each statement, the list of positions of the
+    statements it depends on
+    """
+    analyzed = [analyze_statement(sql) for sql in statements]
+    plan = []
+    for i, (reads, writes, barrier) in enumerate(analyzed):
+        plan.append([
+            j
+            for j, (earlier_reads, earlier_writes, earlier_barrier)
+            in enumerate(analyzed[:i])
+            if barrier or earlier_barrier
+            or earlier_writes & (reads | writes)
+            or writes & earlier_reads
+        ])
+    return plan
@@ -0,0 +1,25 @@
+"""
+Tests that importing snowconn stays cheap: the heavy dependencies must only
+be imported once a connection is made
+"""
+import subprocess
+import sys
+
+# microseconds
+IMPORT_BUDGET = 200_000
+
+
+def test_import_is_lazy_and_fast():
+    import_check = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', (
+            'import sys, snowconn; '
+            'assert "snowflake.connector" not in sys.modules; '
+            'assert "sqlalchemy" not in sys.modules'
+        )],
+        capture_output=True, text=True,
+    )
+    assert import_check.returncode == 0, import_check.stderr
+    # the last line of -X importtime is the cumulative time of snowconn
+    import_us = int(import_check.stderr.strip().splitlines()[-1].split('|')[1])
+    assert import_us < IMPORT_BUDGET, \
+        f'import snowconn took {import_us / 1000:.1f}ms'
@@ -0,0 +1,69 @@
+"""
+Tests of query fingerprints, QueryEvent and MetricsRegistry
+"""
+from snowconn.instrumentation import MetricsRegistry, QueryEvent, fingerprint
+
+
+def test_fingerprint_masks_literals():
+    assert fingerprint("select * from price where shop = 'a' and id = 1") \
+        == fingerprint("select *  from price\nwhere shop = 'it''s' and id = 2.5;")
+    assert fingerprint("select * from price where shop = 'a'") \
+        != fingerprint("select * from stock where shop = 'a'")
+    # digits in identifiers are not literals
+    assert fingerprint('select * from price_1') \
+        != fingerprint('select * from price_2')
+
+
+def test_event_phases_add_up():
+    event = QueryEvent('read_df', 'select 1')
+    for _ in range(2):
+        with event.phase('fetch'):
+            pass
+    event.finish()
+    assert set(event.timings) == {'fetch'}
+    assert 0 <= event.timings['fetch'] <= event.duration
+
+
+def test_counters_keep_full_precision():
+    metrics = MetricsRegistry()
+    metrics.inc('bytes_total', 123456789, method='read_df')
+    metrics.inc('bytes_total', 1, method='read_df')
+    assert ('snowconn_bytes_total{method="read_df"} 123456790.0'
+            in metrics.render().splitlines())
+
+
+def test_render_histograms():
+    metrics = MetricsRegistry(prefix='app')
+    metrics.observe('query_duration_seconds', 0.007, method='read_df')
+    metrics.observe('query_duration_seconds', 1234.5678901, method='read_df')
+    lines = metrics.render().splitlines()
+    assert lines[0] == '# TYPE app_query_duration_seconds histogram'
+    assert 'app_query_duration_seconds_bucket{method="read_df",le="0.005"} 0' \
+        in lines
+    assert 'app_query_duration_seconds_bucket{method="read_df",le="0.01"} 1' \
+        in lines
+    assert 'app_query_duration_seconds_bucket{method="read_df",le="600"} 1' \
+        in lines
+    assert 'app_query_duration_seconds_bucket{method="read_df",le="+Inf"} 2' \
+        in lines
+    assert (f'app_query_duration_seconds_sum{{method="read_df"}} '
+            f'{0.007 + 1234.5678901!r}') in lines
+    assert 'app_query_duration_seconds_count{method="read_df"} 2' in lines
+
+
+def test_records_finished_queries():
+    metrics = MetricsRegistry()
+    event = QueryEvent('execute_simple', 'select 1')
+    event.rows = 3
+    event.finish()
+    metrics.on_query_end(event)
+    event = QueryEvent('execute_simple', 'select 1')
+    event.cached = True
+    event.finish()
+    metrics.on_query_end(event)
+    rendered = metrics.render()
+    assert ('snowconn_queries_total{method="execute_simple",status="ok"} 1.0'
+            in rendered)
+    assert ('snowconn_queries_total{method="execute_simple",status="cached"}'
+            ' 1.0' in rendered)
+    assert 'snowconn_rows_total{method="execute_simple"} 3.0' in rendered
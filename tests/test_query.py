@@ -0,0 +1,38 @@
+"""
+Tests of QueryHandle.wait, with the status polling replaced
+"""
+import time
+
+import pytest
+
+from snowconn.query import QueryHandle
+
+
+class PolledHandle(QueryHandle):
+    """Handle whose query finishes after a number of polls"""
+
+    def __init__(self, polls: int):
+        super().__init__(None, 'query-id', 'select 1')
+        self.polls = polls
+
+    def is_running(self) -> bool:
+        self.polls -= 1
+        return self.polls > 0
+
+
+def test_wait_returns_once_the_query_finished():
+    handle = PolledHandle(3)
+    handle.wait(timeout=5, poll_interval=0.01)
+    assert handle.polls == 0
+
+
+def test_wait_sleeps_until_the_deadline_before_timing_out():
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        PolledHandle(1000).wait(timeout=0.2, poll_interval=1.0)
+    assert 0.2 <= time.monotonic() - started < 0.9
+
+
+def test_query_finishing_before_the_deadline_does_not_time_out():
+    # the first poll interval is longer than the timeout
+    PolledHandle(2).wait(timeout=0.2, poll_interval=0.15)
@@ -0,0 +1,103 @@
+"""
+Tests of ResultCache and of the cache keys of SnowConn
+"""
+import os
+import pickle
+from types import SimpleNamespace
+
+import pytest
+
+from snowconn import SnowConn, result_cache
+from snowconn.result_cache import MISSING, ResultCache, is_value
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'time', clock.time)
+    return clock
+
+
+def get_key(*options, sql='select * from price'):
+    conn = SimpleNamespace(_result_cache=ResultCache())
+    raw_connection = SimpleNamespace(
+        database='db', schema='public', role='analyst')
+    return SnowConn._get_result_cache_key(
+        conn, raw_connection, True, sql, *options)
+
+
+def test_functions_are_not_values():
+    assert is_value(('read_df', True, ['id', 'price'], {'price': 'float32'}))
+    assert is_value(float)
+    assert not is_value(lambda name: name.upper())
+    assert not is_value({'price': str.upper})
+    assert not is_value(object())
+
+
+def test_options_that_are_functions_are_not_cached():
+    # lambdas defined at the same place can share a repr, so their results
+    # must not share a cache entry
+    renames = [lambda name, n=n: f'{name}_{n}' for n in range(2)]
+    assert get_key('read_df', renames[0]) is None
+    assert get_key('read_df', renames[1]) is None
+    assert get_key('read_df', {'id': 'price_id'}) is not None
+
+
+def test_keys_depend_on_options_but_not_whitespace():
+    assert get_key('read_df', True) == get_key(
+        'read_df', True, sql='  select *\n  from price;')
+    assert get_key('read_df', True) != get_key('read_df', False)
+    assert get_key('read_df', True, sql='delete from price') is None
+
+
+def test_results_expire(clock):
+    cache = ResultCache(ttl=10)
+    cache.set('key', [1, 2])
+    clock.now += 9
+    assert cache.get('key') == [1, 2]
+    clock.now += 1
+    assert cache.get('key') is MISSING
+
+
+def test_least_recently_used_results_are_evicted_by_size():
+    size = len(pickle.dumps('x' * 100, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = ResultCache(max_bytes=2 * size)
+    cache.set('a', 'a' * 100)
+    cache.set('b', 'b' * 100)
+    cache.get('a')
+    cache.set('c', 'c' * 100)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 'a' * 100
+    assert cache.get('c') == 'c' * 100
+
+    cache.set('huge', 'x' * 1000)
+    assert cache.get('huge') is MISSING
+    assert cache.get('c') == 'c' * 100
+
+
+def test_get_returns_a_copy():
+    cache = ResultCache()
+    cache.set('key', [{'id': 1}])
+    cache.get('key')[0]['id'] = 2
+    assert cache.get('key') == [{'id': 1}]
+
+
+def test_results_are_shared_on_disk(tmp_path, clock):
+    cache = ResultCache(ttl=10, directory=str(tmp_path))
+    cache.set('key', [1, 2])
+    assert os.listdir(tmp_path) == ['key.pickle']
+    other = ResultCache(ttl=10, directory=str(tmp_path))
+    assert other.get('key') == [1, 2]
+
+    os.utime(tmp_path / 'key.pickle', (clock.now - 10, clock.now - 10))
+    assert other.get('key') is MISSING
+    other.set('other', [3])
+    assert os.listdir(tmp_path) == ['other.pickle']
@@ -0,0 +1,168 @@
+"""
+Tests of RetryPolicy and CircuitBreaker, with the clock and sleeping replaced
+"""
+import pytest
+
+from snowconn import retry
+from snowconn.instrumentation import MetricsRegistry
+from snowconn.retry import (
+    CircuitBreaker, CircuitOpenError, RetryPolicy, get_errno)
+
+
+class SnowflakeError(Exception):
+    """Stands in for the connector errors, which carry an errno"""
+
+    def __init__(self, errno=None):
+        super().__init__(errno)
+        self.errno = errno
+
+
+class WrappedError(Exception):
+    """Stands in for the SQLAlchemy errors wrapping connector errors"""
+
+    def __init__(self, orig):
+        super().__init__(orig)
+        self.orig = orig
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(retry.time, 'sleep', clock.sleep)
+    return clock
+
+
+def failing(*errors, result='ok'):
+    """Returns a function raising the given errors, then returning result"""
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(None)
+        if errors:
+            raise errors.pop(0)
+        return result
+    fn.calls = calls
+    return fn
+
+
+def test_get_errno_looks_through_wrapped_errors():
+    assert get_errno(WrappedError(SnowflakeError(250001))) == 250001
+    assert get_errno(ValueError()) is None
+
+
+def test_retries_transient_errors(clock):
+    policy = RetryPolicy(max_attempts=3, initial_delay=1, jitter=False)
+    fn = failing(SnowflakeError(250003), ConnectionError())
+    assert policy.call(fn) == 'ok'
+    assert len(fn.calls) == 3
+    assert clock.sleeps == [1, 2]
+
+
+def test_gives_up_after_max_attempts(clock):
+    policy = RetryPolicy(max_attempts=2, jitter=False)
+    fn = failing(*[SnowflakeError(250003)] * 3)
+    with pytest.raises(SnowflakeError):
+        policy.call(fn)
+    assert len(fn.calls) == 2
+
+
+def test_does_not_retry_other_errors_or_non_idempotent_calls(clock):
+    policy = RetryPolicy()
+    fn = failing(SnowflakeError(2003))
+    with pytest.raises(SnowflakeError):
+        policy.call(fn)
+    fn = failing(SnowflakeError(250003))
+    with pytest.raises(SnowflakeError):
+        policy.call(fn, idempotent=False)
+    assert len(fn.calls) == 1
+    assert clock.sleeps == []
+
+
+def test_delay_is_capped_and_jittered():
+    policy = RetryPolicy(initial_delay=1, max_delay=5, jitter=False)
+    assert [policy.get_delay(retry) for retry in range(5)] == [1, 2, 4, 5, 5]
+    policy.jitter = True
+    assert all(0 <= policy.get_delay(10) <= 5 for _ in range(100))
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_half_open_circuit_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == 'half_open'
+    breaker.before_call()
+    # only the probe is let through until it finished
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+
+
+def test_non_retryable_error_counts_as_success(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    policy = RetryPolicy(max_attempts=1, circuit_breaker=breaker)
+    with pytest.raises(SnowflakeError):
+        policy.call(failing(SnowflakeError(250001)))
+    # snowflake answered, so the failures are no longer consecutive
+    with pytest.raises(SnowflakeError):
+        policy.call(failing(SnowflakeError(2003)))
+    with pytest.raises(SnowflakeError):
+        policy.call(failing(SnowflakeError(250001)))
+    assert breaker.state == 'closed'
+
+
+def test_open_circuit_fails_fast_and_is_counted(clock):
+    metrics = MetricsRegistry()
+    breaker = CircuitBreaker(failure_threshold=1)
+    policy = RetryPolicy(circuit_breaker=breaker, metrics=metrics)
+    breaker.record_failure()
+    fn = failing()
+    with pytest.raises(CircuitOpenError):
+        policy.call(fn, operation='read_df')
+    assert fn.calls == []
+    assert ('snowconn_circuit_open_total{operation="read_df"} 1.0'
+            in metrics.render())
+
+
+def test_retry_metrics_render_with_and_without_errno(clock):
+    metrics = MetricsRegistry()
+    policy = RetryPolicy(jitter=False, metrics=metrics)
+    # errno is None for connection errors and an int for snowflake ones,
+    # which must not make the labels unsortable
+    policy.call(failing(ConnectionError(), SnowflakeError(250003)))
+    rendered = metrics.render()
+    assert 'snowconn_retries_total{errno="",operation="query"} 1.0' in rendered
+    assert ('snowconn_retries_total{errno="250003",operation="query"} 1.0'
+            in rendered)
+    assert 'snowconn_retry_delay_seconds_count{operation="query"} 2' in rendered
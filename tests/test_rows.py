@@ -0,0 +1,107 @@
+"""
+Tests of the conversion of connector rows to python values
+"""
+from array import array
+import json
+
+import pytest
+
+from snowconn.rows import (
+    LazyRow, RowSchema, decode_columns, get_columns_to_parse, get_json_loads,
+    make_columns)
+
+
+def column(name, type_code, scale=None):
+    # name, type_code, display_size, internal_size, precision, scale, null_ok
+    return (name, type_code, None, None, None, scale, True)
+
+
+# NUMBER(38, 0), FLOAT, TEXT, VARIANT, NUMBER(10, 2)
+DESCRIPTION = [
+    column('ID', 0, 0), column('PRICE', 1), column('SHOP', 2),
+    column('ATTRIBUTES', 5), column('DISCOUNT', 0, 2),
+]
+ROWS = [
+    (1, 9.5, 'a', '{"color": "red"}', 0.5),
+    (2, 3.25, 'b', None, 1.25),
+]
+
+
+class CountingLoads:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        return json.loads(value)
+
+
+def test_get_json_loads():
+    assert get_json_loads('json') is json.loads
+    assert get_json_loads(len) is len
+    assert get_json_loads('auto')('[1, NaN]')[0] == 1
+    with pytest.raises(ValueError):
+        get_json_loads('simplejson')
+
+
+def test_decode_columns():
+    to_parse = get_columns_to_parse(DESCRIPTION)
+    assert to_parse == [3]
+    assert decode_columns(ROWS, to_parse, json.loads) == [
+        [1, 9.5, 'a', {'color': 'red'}, 0.5],
+        [2, 3.25, 'b', None, 1.25],
+    ]
+
+
+def test_lazy_row_decodes_once_on_access():
+    loads = CountingLoads()
+    schema = RowSchema(DESCRIPTION, loads)
+    row = LazyRow(schema, ROWS[0])
+    assert row['ID'] == 1
+    assert loads.calls == 0
+    assert row['ATTRIBUTES'] == {'color': 'red'}
+    assert row['ATTRIBUTES'] is row['ATTRIBUTES']
+    assert loads.calls == 1
+    assert list(row) == ['ID', 'PRICE', 'SHOP', 'ATTRIBUTES', 'DISCOUNT']
+    assert dict(row) == {'ID': 1, 'PRICE': 9.5, 'SHOP': 'a',
+                         'ATTRIBUTES': {'color': 'red'}, 'DISCOUNT': 0.5}
+    # the row returned by the connector is not modified
+    assert ROWS[0][3] == '{"color": "red"}'
+
+
+def test_lazy_row_without_decoding():
+    loads = CountingLoads()
+    row = LazyRow(RowSchema(DESCRIPTION, loads, decode=False), ROWS[0])
+    assert row['ATTRIBUTES'] == '{"color": "red"}'
+    assert LazyRow(RowSchema(DESCRIPTION, loads), ROWS[1])['ATTRIBUTES'] \
+        is None
+    assert loads.calls == 0
+    with pytest.raises(KeyError):
+        row['MISSING']
+
+
+def test_make_columns():
+    columns = make_columns([ROWS[:1], ROWS[1:]], DESCRIPTION, json.loads)
+    assert columns == {
+        'ID': [1, 2], 'PRICE': [9.5, 3.25], 'SHOP': ['a', 'b'],
+        'ATTRIBUTES': [{'color': 'red'}, None], 'DISCOUNT': [0.5, 1.25],
+    }
+    assert make_columns([], DESCRIPTION, json.loads) == {
+        desc[0]: [] for desc in DESCRIPTION}
+
+
+def test_make_columns_arrays():
+    columns = make_columns([ROWS], DESCRIPTION, json.loads, arrays=True)
+    assert columns['ID'] == array('q', [1, 2])
+    assert columns['PRICE'] == array('d', [9.5, 3.25])
+    # NUMBER columns with decimals are not converted
+    assert columns['DISCOUNT'] == [0.5, 1.25]
+
+
+def test_make_columns_arrays_fall_back_to_lists():
+    description = [column('ID', 0, 0), column('PRICE', 1)]
+    rows = [(2 ** 64, None), (1, 9.5)]
+    columns = make_columns([rows], description, json.loads, arrays=True)
+    assert columns == {'ID': [2 ** 64, 1], 'PRICE': [None, 9.5]}
+    assert type(columns['ID']) is list
+    assert type(columns['PRICE']) is list
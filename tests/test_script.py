@@ -0,0 +1,137 @@
+"""
+Tests of the dependency analysis used by execute_string(parallel=True)
+"""
+from snowconn.script import analyze_statement, plan_statements
+
+
+def test_query_reads_tables():
+    reads, writes, barrier = analyze_statement(
+        'select * from a join s."b" on a.id = b.id')
+    assert reads == {'A', 'b'}
+    assert writes == set()
+    assert not barrier
+
+
+def test_create_table_as_select():
+    reads, writes, barrier = analyze_statement(
+        'create or replace temporary table c as select * from a')
+    assert reads == {'A'}
+    assert writes == {'C'}
+    assert not barrier
+
+
+def test_literals_and_comments_are_ignored():
+    reads, writes, _ = analyze_statement(
+        "select 'from x' from a -- join y\n/* from z */")
+    assert reads == {'A'}
+    assert writes == set()
+
+
+def test_session_statements_are_barriers():
+    for sql in ('use schema s', 'set x = 1', 'alter session set a = 1',
+                'call p()'):
+        assert analyze_statement(sql)[2], sql
+
+
+def test_alter_rename_writes_both_names():
+    _, writes, barrier = analyze_statement('alter table c rename to s.d')
+    assert writes == {'C', 'D'}
+    assert not barrier
+
+
+def test_alter_swap_writes_both_tables():
+    _, writes, _ = analyze_statement('ALTER TABLE IF EXISTS a SWAP WITH b')
+    assert writes == {'A', 'B'}
+
+
+def test_independent_statements_do_not_wait():
+    assert plan_statements([
+        'create table a as select 1 x',
+        'create table b as select 2 x',
+        'select * from c',
+    ]) == [[], [], []]
+
+
+def test_read_after_write():
+    assert plan_statements([
+        'create table a as select 1 x',
+        'select * from a',
+    ]) == [[], [0]]
+
+
+def test_write_after_read():
+    assert plan_statements([
+        'select * from a',
+        'insert into a select 1',
+    ]) == [[], [0]]
+
+
+def test_read_after_rename():
+    assert plan_statements([
+        'alter table c rename to d',
+        'select * from d',
+    ]) == [[], [0]]
+
+
+def test_read_after_swap():
+    assert plan_statements([
+        'alter table a swap with b',
+        'select * from b',
+    ]) == [[], [0]]
+
+
+def test_barrier_waits_and_is_waited_for():
+    assert plan_statements([
+        'select * from a',
+        'use schema s',
+        'select * from b',
+    ]) == [[], [0], [1]]
+
+
+def test_depends_on_annotation():
+    assert plan_statements([
+        'call load_a()',
+        'create table b as select 1 x',
+        '-- depends_on: b\nselect * from view_on_b',
+    ])[2] == [0, 1]
+
+
+def test_comma_separated_from_list():
+    reads, writes, barrier = analyze_statement(
+        'create table c as select * from s.a x, "b" as y, d where x.id = y.id')
+    assert reads == {'A', 'b', 'D'}
+    assert writes == {'C'}
+    assert not barrier
+
+
+def test_read_from_comma_list_after_write():
+    assert plan_statements([
+        'create or replace table b as select 1 id',
+        'create table c as select * from a, b',
+    ]) == [[], [0]]
+
+
+def test_unparsed_from_list_is_a_barrier():
+    for sql in ('select * from a, lateral flatten(input => a.v) f',
+                'select * from a, (select 1 from b) s',
+                'select * from a, table(flatten(a.v))'):
+        assert analyze_statement(sql)[2], sql
+
+
+def test_in_list_is_not_a_from_list():
+    reads, _, barrier = analyze_statement(
+        'select x, y from a where a.k in (1, 2)')
+    assert reads == {'A'}
+    assert not barrier
+
+
+def test_quote_in_comment_does_not_hide_tables():
+    sql = ("create table c as select * from a -- a's rows\n"
+           "join b on a.id = b.id where a.k = 'z'")
+    assert analyze_statement(sql)[0] == {'A', 'B'}
+    assert plan_statements(['insert into b select 1', sql]) == [[], [0]]
+
+
+def test_comment_in_literal_is_kept_a_literal():
+    reads, _, _ = analyze_statement("select '-- x' from a join b on 1 = 1")
+    assert reads == {'A', 'B'}